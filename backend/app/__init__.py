@@ -1,11 +1,19 @@
-from flask import Flask, request, jsonify, send_from_directory
-import os, cv2 
+from flask import Flask, request, jsonify, send_from_directory, g, Response
+import os, sys, time, threading, json
 from flask_cors import CORS
-from random import randint
-from scripts.methods import ( init, verify_token, upload_file_to_storage, update_video_firestore
-                            ,get_userData_from_firestore)
+# Shared worker modules (metrics, ...) live in ../ml_model.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ml_model"))
+import metrics
+from scripts.methods import ( init, verify_token, get_userData_from_firestore, new_video_ref, enqueue_video
+                            ,stream_to_storage, get_recent_videos, count_pending_videos, discard_upload
+                            ,watch_profiles)
+from scripts.cadence import CadencePolicy, LoadMonitor, RecentVideosCache, fatigue_score
+from scripts.notifications import CompletionListener, ResultBroker
+from scripts.repository import db
+from scripts.uploads import iter_upload, save_upload
 # import scripts.methods
-from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+from committer import retry
 from scripts.sms import sms_emg
 
 app = Flask(__name__)
@@ -17,78 +25,178 @@ except:
     os.chdir("Driver-Drowsiness-Detection-System")
     init()
 
-# Define the folder where uploaded files will be saved
-UPLOAD_FOLDER = '../DOWNLOAD'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Configure Flask to save uploaded files in the specified folder
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Writes the Firestore job record for each upload after the response is sent.
+# At most ENQUEUE_MAX_PENDING records wait; beyond that /upload writes its
+# record before responding.
+enqueue_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="enqueue")
+enqueue_slots = threading.BoundedSemaphore(int(os.getenv("ENQUEUE_MAX_PENDING", "64")))
+
+REQUEST_SECONDS = metrics.histogram("api_request_seconds", "API request latency.", ["endpoint", "status"])
+UPLOAD_PHASE_SECONDS = metrics.histogram("api_upload_phase_seconds", "Time spent in each phase of /upload.", ["phase"])
+
+# /data paces each phone's next recording by driver state and fleet load.
+recent_videos = RecentVideosCache(get_recent_videos, ttl=float(os.getenv("CADENCE_RECENT_TTL", "60")))
+load_monitor = LoadMonitor(count_pending_videos, refresh=float(os.getenv("CADENCE_REFRESH", "15")))
+cadence = CadencePolicy(min_wait=float(os.getenv("CADENCE_MIN_WAIT", "5")),
+                        base_wait=float(os.getenv("CADENCE_BASE_WAIT", "15")),
+                        max_wait=float(os.getenv("CADENCE_MAX_WAIT", "120")),
+                        target_depth=int(os.getenv("CADENCE_TARGET_BACKLOG", "20")),
+                        target_latency=float(os.getenv("CADENCE_TARGET_LATENCY", "60")))
+
+# Finished analyses are pushed to the phones over /results/stream (SSE) or
+# /results/poll (long-poll), fed by one Firestore listener for all users.
+broker = ResultBroker()
+HEARTBEAT_SECONDS = float(os.getenv("NOTIFY_HEARTBEAT", "15"))
+POLL_TIMEOUT = float(os.getenv("NOTIFY_POLL_TIMEOUT", "25"))
+
+# /analyze scores short clips in this process through one shared model; it
+# is loaded in the background so the app is ready without waiting for it.
+ANALYZE_MAX_BYTES = int(os.getenv("ANALYZE_MAX_MB", "50")) * 1024 * 1024
+ANALYZE_MAX_FRAMES = int(os.getenv("ANALYZE_MAX_FRAMES", "900"))
+model_server = None
+
+def start_model_server():
+    global model_server
+    from implementation import DrowsinessDetector
+    from model_server import ModelServer
+    model_path = os.getenv("DETECTOR_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                                               "ml_model", "multi_task_drowsiness_model.h5"))
+    try:
+        detector = DrowsinessDetector(model_path, backend=os.getenv("DETECTOR_BACKEND", "keras"))
+        max_batch_size = int(os.getenv("ANALYZE_MAX_BATCH", "32"))
+        detector.warm_up((1, max_batch_size))
+        model_server = ModelServer(detector, max_batch_size,
+                                   max_wait=float(os.getenv("ANALYZE_MAX_WAIT_MS", "10")) / 1000).start()
+        print("Model server ready for /analyze.")
+    except Exception as e:
+        print(f"Model server failed to start, /analyze is unavailable: {e}")
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if "request_start" in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=request.endpoint or "unknown",
+                                status=response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    if not metrics.is_ready():
+        return jsonify({"status": "starting"}), 503
+    return jsonify({"status": "ready"}), 200
 
 @app.route('/upload', methods=['POST'])
 def upload_video():
-    # Check if the 'video' file is part of the request
-    if 'video' not in request.files:
-        return jsonify({"error": "No video file part"}), 400
-    
-    # Get the video file from the request
-    video_file = request.files['video']
-    authentication = verify_token(request.headers["Autherization"])
-
-
-    # If no file was selected
-    if video_file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
-
-    # Save the file to the UPLOAD_FOLDER
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], video_file.filename)
-    video_file.save(file_path)
-
-    storage_path = f"videos/{authentication['uid']}/{uuid4()}.mov"
-    blob = upload_file_to_storage(file_path, storage_path)
-    # video_url = blob.public_url
-    update_video_firestore(storage_path, authentication['uid'])
-    
-    ################################
-
-    # cap = cv2.VideoCapture(file_path)
-
-    # # Chqeck if camera opened successfully
-    # if (cap.isOpened()== False):
-    #     print("Error opening video file")
-
-    # # Read until video is completed
-    # while(cap.isOpened()):
-        
-    # # Capture frame-by-frame
-    #     ret, frame = cap.read()
-    #     if ret == True:
-    #     # Display the resulting frame
-    #         cv2.imshow('Frame', frame)
-            
-    #     # Press Q on keyboard to exit
-    #         if cv2.waitKey(25) & 0xFF == ord('q'):
-    #             break
-
-    # # Break the loop
-    #     else:
-    #         break
-
-    # # When everything done, release
-    # # the video capture object
-    # cap.release()
-
-    # # Closes all the frames
-    # cv2.destroyAllWindows()
-
-
-    ###############################
-
-
-    return jsonify({"message": "Video uploaded successfully!", "file_path": file_path}), 200
+    # The body (a multipart 'video' field or the raw video) is streamed
+    # straight to Storage; the job is queued for the worker in the
+    # background and the client gets its id as soon as the transfer ends.
+    with UPLOAD_PHASE_SECONDS.time(phase="verify_token"):
+        authentication = verify_token(request.headers.get("Autherization", ""))
+    if authentication is None:
+        return jsonify({"error": "Invalid or missing token"}), 401
+
+    video_ref = new_video_ref(authentication['uid'])
+    storage_path = f"videos/{authentication['uid']}/{video_ref.id}.mov"
+    try:
+        with UPLOAD_PHASE_SECONDS.time(phase="stream_to_storage"):
+            size, content_hash = stream_to_storage(iter_upload(request, "video"), storage_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if enqueue_slots.acquire(blocking=False):
+        enqueue_pool.submit(enqueue_in_background, video_ref, storage_path, content_hash)
+    elif not enqueue_upload(video_ref, storage_path, content_hash):
+        return jsonify({"error": "Could not queue the video for analysis"}), 503
+    return jsonify({"message": "Video accepted", "job_id": video_ref.id, "status": "pending",
+                    "file_path": storage_path, "size": size}), 202
+
+def enqueue_in_background(video_ref, storage_path, content_hash):
+    try:
+        enqueue_upload(video_ref, storage_path, content_hash)
+    finally:
+        enqueue_slots.release()
+
+def enqueue_upload(video_ref, storage_path, content_hash):
+    try:
+        with UPLOAD_PHASE_SECONDS.time(phase="enqueue"):
+            retry(lambda: enqueue_video(video_ref, storage_path, content_hash))
+        return True
+    except Exception as e:
+        print(f"Failed to queue {storage_path} for analysis: {e}")
+        discard_upload(video_ref, storage_path, str(e))
+        return False
+
+@app.route('/analyze', methods=['POST'])
+def analyze_clip():
+    if verify_token(request.headers.get("Autherization", "")) is None:
+        return jsonify({"error": "Invalid or missing token"}), 401
+    if model_server is None:
+        return jsonify({"error": "Model is not loaded"}), 503
+
+    target_fps = request.args.get("target_fps", 15, type=float)
+    max_frames = min(request.args.get("max_frames", ANALYZE_MAX_FRAMES, type=int), ANALYZE_MAX_FRAMES)
+    try:
+        video_path = save_upload(iter_upload(request, "video"), ANALYZE_MAX_BYTES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        results = model_server.analyze_video(video_path, target_fps=target_fps, max_frames=max_frames, timeout=60)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        os.unlink(video_path)
+    return jsonify({"frames": list(results), "summary": results.summary()}), 200
+
+def subscriber_uid():
+    # EventSource cannot set headers, so the token may also come as ?token=.
+    token = request.headers.get("Autherization") or request.args.get("token", "")
+    authentication = verify_token(token)
+    return authentication['uid'] if authentication is not None else None
+
+def last_event_id():
+    return request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+
+@app.route('/results/stream', methods=['GET'])
+def stream_results():
+    uid = subscriber_uid()
+    if uid is None:
+        return jsonify({"error": "Invalid or missing token"}), 401
+    subscription = broker.subscribe(uid, last_event_id())
+
+    def events():
+        with subscription:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: result\ndata: {json.dumps(event)}\n\n"
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/results/poll', methods=['GET'])
+def poll_results():
+    uid = subscriber_uid()
+    if uid is None:
+        return jsonify({"error": "Invalid or missing token"}), 401
+    timeout = min(request.args.get("timeout", POLL_TIMEOUT, type=float), POLL_TIMEOUT)
+    with broker.subscribe(uid, last_event_id()) as subscription:
+        event = subscription.get(timeout=timeout)
+    if event is None:
+        return "", 204
+    return jsonify(event), 200
 
 @app.route('/data', methods=['POST'])
 def get_data():
-    i = randint(10,20)
     authentication = verify_token(request.headers["Autherization"])
     uid = authentication['uid']
     user_data = get_userData_from_firestore(uid)
@@ -96,9 +204,50 @@ def get_data():
     # sms_emg(user_data['emg_name'],user_data['emg_phone'], user_data['name'])
     return jsonify({
         'status': 'success',
-        'waitDuration': i
+        'waitDuration': next_wait_duration(uid)
     }), 200
 
+def next_wait_duration(uid):
+    try:
+        recent = recent_videos.get(uid)
+    except Exception as e:
+        print(f"Could not read recent videos for {uid}: {e}")
+        recent = []
+
+    # Fatigue comes from the newest analysed clip; an unfinished newer one
+    # has already waited this long, so latency is at least its age.
+    latency = load_monitor.latency
+    results = None
+    for video in recent:
+        if video.get("results") is None:
+            stored = video.get("time_stored")
+            if video.get("status") in ("pending", "processing") and hasattr(stored, "timestamp"):
+                latency = max(latency or 0, time.time() - stored.timestamp())
+            continue
+        if video.get("latency_seconds") is not None:
+            load_monitor.observe_latency(video["file_path"], video["latency_seconds"])
+            latency = max(latency or 0, load_monitor.latency)
+        results = video["results"]
+        break
+    return cadence.wait_duration(fatigue_score(results), load_monitor.queue_depth(), latency)
+
+
+# Firebase is initialised above; only /analyze needs the model, and it
+# answers 503 until the background load finishes.
+metrics.set_ready()
+if os.getenv("NOTIFY_ENABLED", "1") != "0":
+    try:
+        completion_listener = CompletionListener(db(), broker, replay=float(os.getenv("NOTIFY_REPLAY", "300")),
+                                                 on_completion=recent_videos.update)
+    except Exception as e:
+        print(f"Completion listener failed to start, result notifications are unavailable: {e}")
+if os.getenv("PROFILE_WATCH", "1") != "0":
+    try:
+        profile_watcher = watch_profiles()
+    except Exception as e:
+        print(f"Profile listener failed to start, profile edits apply after PROFILE_CACHE_TTL: {e}")
+if os.getenv("ANALYZE_ENABLED", "1") != "0":
+    threading.Thread(target=start_model_server, name="model-loader", daemon=True).start()
 
 if __name__ == "__main__":
     app.run(host = "0.0.0.0")
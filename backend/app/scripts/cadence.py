@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from ttl_cache import TTLCache
+
+RECENT_LOOKUPS = metrics.counter("recent_videos_cache_total", "Recent-video cache lookups from /data, by outcome.",
+                                 ["result"])
+WAIT_SECONDS = metrics.histogram("cadence_wait_seconds", "waitDuration handed to the phones by /data.",
+                                 buckets=(5, 10, 15, 20, 30, 45, 60, 90, 120, 300))
+
+
+def fatigue_score(summary):
+    """
+    0 (alert) to 1 (clearly fatigued) from a video's results summary:
+    the larger of the drowsy share of frames (Low Vigilant counting half),
+    the share of eyes-closed frames, and 1 if the clip was mostly yawning.
+    """
+    if not summary or not summary.get("total_frames"):
+        return 0.0
+    percentages = summary.get("alertness_percentages", {})
+    drowsy = (percentages.get("Very Drowsy", 0.0) + 0.5 * percentages.get("Low Vigilant", 0.0)) / 100
+    eyes_closed = summary.get("eyes_closed_frames", 0) / summary["total_frames"]
+    yawning = 1.0 if summary.get("yawning_state") == "Yawning" else 0.0
+    return min(1.0, max(drowsy, eyes_closed, yawning))
+
+
+class RecentVideosCache:
+    """
+    Each user's latest video documents, as /data reads them, kept for ttl
+    seconds (at most max_entries users) so a phone polling /data does not
+    cost a query every time. update() is fed by the completion listener, so
+    a finished analysis replaces the cached copy straight away.
+    """
+
+    def __init__(self, load, limit=3, ttl=60, max_entries=10000, clock=time.monotonic):
+        self.load = load
+        self.limit = limit
+        self.entries = TTLCache(max_entries, ttl, clock)
+
+    def get(self, uid):
+        videos = self.entries.get(uid)
+        if videos is not None:
+            RECENT_LOOKUPS.inc(result="hit")
+            return list(videos)
+        RECENT_LOOKUPS.inc(result="miss")
+        videos = self.load(uid, self.limit)
+        self.entries.put(uid, list(videos))
+        return list(videos)
+
+    def update(self, uid, video):
+        videos = [v for v in self.entries.get(uid) or () if v.get("file_path") != video.get("file_path")]
+        # Newest first; the finished video may already be behind newer uploads.
+        videos = sorted([video] + videos, key=lambda v: _stored_at(v), reverse=True)[:self.limit]
+        self.entries.put(uid, videos)
+
+
+def _stored_at(video):
+    stored = video.get("time_stored")
+    return stored.timestamp() if hasattr(stored, "timestamp") else 0.0
+
+
+class LoadMonitor:
+    """
+    Fleet load as seen from the API: the number of pending videos, counted
+    at most once every refresh seconds, and a moving average of the
+    upload-to-result latency the workers record on finished videos.
+    """
+
+    def __init__(self, count_pending, refresh=15, smoothing=0.2, clock=time.monotonic):
+        self.count_pending = count_pending
+        self.refresh = refresh
+        self.smoothing = smoothing
+        self.clock = clock
+        self.depth = 0
+        self.counted = None
+        self.latency = None
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def queue_depth(self):
+        with self.lock:
+            stale = self.counted is None or self.clock() - self.counted >= self.refresh
+            if stale:
+                # Only the first caller refreshes; the rest use the old value.
+                self.counted = self.clock()
+        if stale:
+            try:
+                self.depth = self.count_pending()
+            except Exception as e:
+                print(f"Could not count pending videos: {e}")
+        return self.depth
+
+    def observe_latency(self, key, seconds):
+        # Each finished video is counted once however often its user polls.
+        with self.lock:
+            if key in self.seen:
+                return
+            self.seen[key] = True
+            if len(self.seen) > 1000:
+                self.seen.popitem(last=False)
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += self.smoothing * (seconds - self.latency)
+
+
+class CadencePolicy:
+    """
+    Seconds a phone should wait before its next recording.
+
+    Starts from base_wait, shortened by up to fatigue_boost for a fatigued
+    driver, then stretched by the load factor: how far the pending backlog
+    is over target_depth or the latency over target_latency, whichever is
+    worse. A little jitter keeps phones from uploading in lockstep.
+    """
+
+    def __init__(self, min_wait=5, base_wait=15, max_wait=120, fatigue_boost=0.6, target_depth=20,
+                 target_latency=60, jitter=0.1, rng=random.random):
+        self.min_wait = min_wait
+        self.base_wait = base_wait
+        self.max_wait = max_wait
+        self.fatigue_boost = fatigue_boost
+        self.target_depth = target_depth
+        self.target_latency = target_latency
+        self.jitter = jitter
+        self.rng = rng
+
+    def load_factor(self, queue_depth, latency=None):
+        load = max(1.0, queue_depth / self.target_depth)
+        if latency is not None:
+            load = max(load, latency / self.target_latency)
+        return load
+
+    def wait_duration(self, fatigue=0.0, queue_depth=0, latency=None):
+        wait = self.base_wait * (1 - self.fatigue_boost * fatigue)
+        wait *= self.load_factor(queue_depth, latency)
+        wait *= 1 + self.jitter * (2 * self.rng() - 1)
+        wait = int(round(min(max(wait, self.min_wait), self.max_wait)))
+        WAIT_SECONDS.observe(wait)
+        return wait
@@ -1,10 +1,31 @@
 
-import cv2
 import firebase_admin
-from firebase_admin import credentials, storage, auth, firestore
+from firebase_admin import credentials, storage, auth
 from dotenv import load_dotenv
-import os, time
+import os, time, hashlib
 import requests
+import metrics
+from scripts.token_cache import TokenCache
+from scripts.repository import ProfileWatcher, UserRepository, VideoRepository
+
+VERIFY_TOKEN_SECONDS = metrics.histogram("verify_token_seconds", "Time to verify a Firebase ID token.", ["result"])
+STORAGE_SECONDS = metrics.histogram("storage_call_seconds", "Cloud Storage call latency.", ["operation"])
+
+# Firestore access goes through these; both share one client. Profiles are
+# cached for PROFILE_CACHE_TTL seconds; watch_profiles() drops an entry as
+# soon as its document changes, and the TTL bounds how stale a profile
+# edited on the phone can be if that listener is not running.
+users = UserRepository(ttl=float(os.getenv("PROFILE_CACHE_TTL", "60")),
+                       max_entries=int(os.getenv("PROFILE_CACHE_SIZE", "1000")))
+videos = VideoRepository()
+
+# The phone resends the same ID token with every request; verified tokens
+# are reused until they expire or TOKEN_CACHE_TTL seconds pass. A TTL of 0
+# verifies every request.
+token_cache = None
+if float(os.getenv("TOKEN_CACHE_TTL", "300")) > 0:
+    token_cache = TokenCache(max_entries=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+                             max_ttl=float(os.getenv("TOKEN_CACHE_TTL", "300")))
 
 
 
@@ -43,48 +64,64 @@ def download_video_from_storage(file_path):
     blob = bucket.blob(file_path)
     
     # Download the file to the local path
-    blob.download_to_filename(local_file_path)
+    with STORAGE_SECONDS.time(operation="download"):
+        blob.download_to_filename(local_file_path)
 
     print(f"File {file_name} downloaded successfully.")
 
 def get_data_from_firestore(uid):
-    db = firestore.client()
-    # Reference to your collection (replace 'your-collection-name' with your collection's name)
-    collection_ref = db.collection('users').document(uid).collection('videos')
-    print(collection_ref)
-    # Fetch all documents in the collection
-    query = collection_ref.order_by('time_stored', direction=firestore.Query.DESCENDING).limit(1)
-
-    # Fetch the document
-    docs = query.stream()
-    doc = next(docs, None)
-    video_path = doc.to_dict()['file_path']
+    # File path of the user's most recent video
+    video = videos.latest(uid)
+    video_path = video['file_path']
     return video_path
 #############################################
 
+def get_recent_videos(uid, limit=3):
+    return videos.recent(uid, limit)
+
+def count_pending_videos():
+    return videos.pending_count()
+
 def get_userData_from_firestore(uid):
-    db = firestore.client()
-    # Reference to your collection (replace 'your-collection-name' with your collection's name)
-    collection_ref = db.collection('users').document(uid)
-    print(collection_ref)
-    # Fetch all documents in the collection
-    # query = collection_ref.order_by('time_stored', direction=firestore.Query.DESCENDING).limit(1)
-
-    # Fetch the document
-    # docs = query.stream()
-    doc = collection_ref.get()
-    video_path = doc.to_dict()
-    return video_path
+    # Served from the profile cache when it is fresh
+    return users.get_profile(uid)
+
+def update_userData_in_firestore(uid, fields):
+    users.update_profile(uid, fields)
+
+def watch_profiles():
+    # Call after init(); returns the watcher so it can be closed.
+    return ProfileWatcher(users)
 
 
 def verify_token(token):
+    if token_cache is not None:
+        decoded_token = token_cache.get(token)
+        if decoded_token is not None:
+            return decoded_token
+    start = time.perf_counter()
     try:
         decoded_token = auth.verify_id_token(token)
+        VERIFY_TOKEN_SECONDS.observe(time.perf_counter() - start, result="valid")
+        if token_cache is not None:
+            token_cache.put(token, decoded_token)
         return decoded_token  # This returns the decoded token with user details
     except Exception as e:
+        VERIFY_TOKEN_SECONDS.observe(time.perf_counter() - start, result="invalid")
         print(f"Error verifying token: {e}")
         return None
 
+def revoke_user_tokens(uid):
+    # Signs the user out everywhere: Firebase stops issuing tokens from their
+    # refresh tokens and the ones already verified here are forgotten.
+    auth.revoke_refresh_tokens(uid)
+    if token_cache is not None:
+        token_cache.revoke_user(uid)
+
+def forget_token(token):
+    if token_cache is not None:
+        token_cache.revoke_token(token)
+
 # Upload a file to Firebase Storage
 def upload_file_to_storage(file_path, storage_path):
     # Reference to the Firebase Storage bucket
@@ -94,22 +131,67 @@ def upload_file_to_storage(file_path, storage_path):
     blob = bucket.blob(storage_path)
 
     # Upload the file
-    blob.upload_from_filename(file_path)
+    with STORAGE_SECONDS.time(operation="upload"):
+        blob.upload_from_filename(file_path)
 
     print(f"File {file_path} uploaded to {storage_path}")
 
     return blob
 
-def update_video_firestore(video_path, user_id):
+# Resumable upload chunk size; must be a multiple of 256 KiB. Bounds the
+# memory a streamed upload holds however large the clip is.
+STORAGE_CHUNK_SIZE = 8 * 256 * 1024
+
+def stream_to_storage(chunks, storage_path, content_type="video/quicktime"):
+    """
+    Writes an iterable of byte chunks straight to a Storage blob through a
+    resumable upload, hashing them on the way; nothing touches local disk.
+    Returns (size, sha256 hex digest). A failed or empty upload is deleted.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    blob = storage.bucket().blob(storage_path)
+    try:
+        with STORAGE_SECONDS.time(operation="stream_upload"):
+            with blob.open("wb", chunk_size=STORAGE_CHUNK_SIZE, content_type=content_type) as writer:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    writer.write(chunk)
+    except BaseException:
+        _delete_quietly(blob)
+        raise
+    if size == 0:
+        _delete_quietly(blob)
+        raise ValueError("Empty upload")
+    return size, digest.hexdigest()
+
+def _delete_quietly(blob):
+    try:
+        blob.delete()
+    except Exception:
+        pass
+
+def new_video_ref(user_id):
+    return videos.new_ref(user_id)
+
+def enqueue_video(video_ref, video_path, content_hash=None):
+    videos.enqueue(video_ref, video_path, content_hash)
+
+def discard_upload(video_ref, storage_path, error):
+    # The upload could not be queued: record the job as failed if Firestore
+    # allows it, and delete the file nobody will analyse.
+    try:
+        videos.fail(video_ref, storage_path, error)
+    except Exception as e:
+        print(f"Could not record failed upload {storage_path}: {e}")
+    _delete_quietly(storage.bucket().blob(storage_path))
+
+def update_video_firestore(video_path, user_id, content_hash=None):
     current_time = time.strftime("%H:%M:%S", time.localtime())
 
         # Step 6: Save metadata about the video in Firestore
-    db = firestore.client()
-    video_ref = db.collection('users').document(user_id).collection('videos').document()
-    video_ref.set({
-        'file_path': video_path,
-        'time_stored': current_time,
-    })
+    videos.enqueue(videos.new_ref(user_id), video_path, content_hash, time_stored=current_time)
 
 def get_url_and_time(user_id):
     # db = firestore.Client()
@@ -143,6 +225,10 @@ def preprocess(video, width=240, height=240):
     Returns:
     - output_video (str): The path of the resized video.
     """
+    # OpenCV is only needed here, so it is imported on first use rather than
+    # on every app start.
+    import cv2
+
     # Open the video file using OpenCV
     cap = cv2.VideoCapture(video)
 
@@ -0,0 +1,217 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+
+import metrics
+from scripts.cadence import fatigue_score
+
+NOTIFICATIONS = metrics.counter("result_notifications_total", "Result notifications, by outcome.", ["event"])
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def event_id(completed_at, video_id):
+    """
+    A result event's id: the video's completed_at in epoch microseconds and
+    its document id. It comes from Firestore, so it is the same in every
+    app process and across restarts.
+    """
+    return f"{(completed_at - EPOCH) // timedelta(microseconds=1)}-{video_id}"
+
+
+def event_key(value):
+    """The comparable (microseconds, video id) of an event id, or None if it is not one."""
+    micros, _, video_id = str(value).partition("-")
+    return (int(micros), video_id) if micros.isdigit() else None
+
+
+def completion_event(video_id, data):
+    """The notification for a finished video document; only JSON-safe fields."""
+    results = data.get("results")
+    return {
+        "id": event_id(data["completed_at"], video_id),
+        "video_id": video_id,
+        "file_path": data.get("file_path"),
+        "status": data.get("status"),
+        "results": results,
+        "result_json_url": data.get("result_json_url"),
+        "fatigue": fatigue_score(results),
+    }
+
+
+class Subscription:
+    """One open connection's queue of events; use as a context manager so it is always unsubscribed."""
+
+    def __init__(self, broker, uid, max_queued):
+        self.broker = broker
+        self.uid = uid
+        self.queue = queue.Queue(maxsize=max_queued)
+
+    def put(self, event):
+        # A client that stops reading loses its oldest events, never blocks the publisher.
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    NOTIFICATIONS.inc(event="dropped")
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """The next event, or None after timeout seconds without one."""
+        try:
+            event = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        NOTIFICATIONS.inc(event="delivered")
+        return event
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultBroker:
+    """
+    Fans completion events out to every open connection of their user.
+
+    Each subscriber has its own bounded queue, so publishing never waits on
+    a client. Events carry their event_id() and the last backlog events per
+    user are kept (for at most max_users users), so a client reconnecting
+    with the last id it saw, or a long-poll between requests, misses nothing.
+    """
+
+    def __init__(self, max_queued=32, backlog=16, max_users=10000):
+        self.max_queued = max_queued
+        self.backlog = backlog
+        self.max_users = max_users
+        self.subscribers = {}
+        self.recent = OrderedDict()
+        self.lock = threading.Lock()
+
+    def subscribe(self, uid, last_event_id=None):
+        subscription = Subscription(self, uid, self.max_queued)
+        with self.lock:
+            self.subscribers.setdefault(uid, set()).add(subscription)
+            after = event_key(last_event_id) if last_event_id is not None else None
+            if after is not None:
+                for event in self.recent.get(uid, ()):
+                    if event_key(event["id"]) > after:
+                        subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.uid)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.uid]
+
+    def publish(self, uid, event):
+        with self.lock:
+            recent = self.recent.get(uid)
+            if recent is None:
+                recent = self.recent[uid] = deque(maxlen=self.backlog)
+            self.recent.move_to_end(uid)
+            recent.append(event)
+            while len(self.recent) > self.max_users:
+                self.recent.popitem(last=False)
+            subscribers = list(self.subscribers.get(uid, ()))
+        NOTIFICATIONS.inc(event="published")
+        for subscription in subscribers:
+            subscription.put(event)
+        return event
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+
+class CompletionListener:
+    """
+    Feeds the broker from one Firestore snapshot listener on video
+    documents completed since replay seconds before it started, for all
+    users, so after a restart the broker's backlog holds what finished
+    while it was down.
+
+    The listener keeps its matches in memory, so it is restarted every
+    renew_interval seconds from the time of the last event seen (or sooner
+    if it stops); each completion is published once across restarts.
+    """
+
+    def __init__(self, db, broker, renew_interval=3600, overlap=60, replay=300, on_completion=None):
+        self.db = db
+        self.broker = broker
+        # Optional on_completion(uid, data) for other in-process consumers.
+        self.on_completion = on_completion
+        self.renew_interval = renew_interval
+        self.overlap = overlap
+        self.published = OrderedDict()
+        self.since = datetime.now(timezone.utc) - timedelta(seconds=replay)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.watch = self._listen(self.since)
+        self.thread = threading.Thread(target=self._renew_loop, name="completion-listener", daemon=True)
+        self.thread.start()
+
+    def _listen(self, since):
+        query = self.db.collection_group("videos").where("completed_at", ">", since)
+        return query.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        for change in changes:
+            if change.type.name == "REMOVED":
+                continue
+            data = change.document.to_dict()
+            if data.get("status") != "complete":
+                continue
+            key = (change.document.reference.path, str(data.get("completed_at")))
+            with self.lock:
+                if key in self.published:
+                    continue
+                self.published[key] = True
+                if len(self.published) > 10000:
+                    self.published.popitem(last=False)
+                completed = data.get("completed_at")
+                if completed is not None and completed > self.since:
+                    self.since = completed
+            uid = change.document.reference.parent.parent.id
+            if self.on_completion is not None:
+                try:
+                    self.on_completion(uid, data)
+                except Exception as e:
+                    print(f"Completion callback failed for {change.document.reference.path}: {e}")
+            self.broker.publish(uid, completion_event(change.document.id, data))
+
+    def _renew_loop(self):
+        started = time.monotonic()
+        while not self.stop_event.wait(5):
+            if self.watch.is_active and time.monotonic() - started < self.renew_interval:
+                continue
+            # Start the new listener slightly before the last event seen, so
+            # nothing committed around the switch is missed; duplicates are
+            # filtered out in _on_snapshot.
+            with self.lock:
+                since = self.since - timedelta(seconds=self.overlap)
+            old = self.watch
+            try:
+                self.watch = self._listen(since)
+                started = time.monotonic()
+            except Exception as e:
+                print(f"Could not restart the completion listener: {e}")
+                continue
+            old.unsubscribe()
+
+    def close(self):
+        self.stop_event.set()
+        self.watch.unsubscribe()
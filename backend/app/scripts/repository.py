@@ -0,0 +1,138 @@
+import threading
+import time
+
+from firebase_admin import firestore
+
+import metrics
+from ttl_cache import TTLCache
+
+FIRESTORE_SECONDS = metrics.histogram("firestore_call_seconds", "Firestore call latency.", ["operation"])
+PROFILE_LOOKUPS = metrics.counter("user_profile_cache_total", "User profile cache lookups, by outcome.", ["result"])
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def db():
+    """The process-wide Firestore client, created on first use (after firebase_admin is initialised)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = firestore.client()
+    return _client
+
+
+class UserRepository:
+    """
+    users/{uid} documents, read through an LRU cache.
+
+    A cached profile is served for up to ttl seconds; at most max_entries
+    are kept. Updates made through update_profile() invalidate the entry
+    straight away. The phone edits profiles directly in Firestore; a
+    ProfileWatcher invalidates those as they happen, and without one (or
+    while its listener is down) they show up once the entry expires.
+    """
+
+    def __init__(self, client=None, ttl=60, max_entries=1000, clock=time.monotonic):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = TTLCache(max_entries, ttl, clock)
+
+    def _document(self, uid):
+        return (self.client or db()).collection('users').document(uid)
+
+    def get_profile(self, uid):
+        """The user's document as a dict, or None if it does not exist."""
+        profile = self.entries.get(uid)
+        if profile is not None:
+            PROFILE_LOOKUPS.inc(result="hit")
+            return dict(profile)
+        PROFILE_LOOKUPS.inc(result="miss")
+
+        with FIRESTORE_SECONDS.time(operation="get_user"):
+            profile = self._document(uid).get().to_dict()
+        if profile is not None:
+            self.entries.put(uid, dict(profile))
+        return profile
+
+    def update_profile(self, uid, fields):
+        with FIRESTORE_SECONDS.time(operation="update_user"):
+            self._document(uid).set(fields, merge=True)
+        self.invalidate(uid)
+
+    def invalidate(self, uid):
+        self.entries.pop(uid)
+
+
+class ProfileWatcher:
+    """
+    Invalidates a UserRepository's cached profiles from a snapshot listener
+    on the users collection, so edits written straight to Firestore (by the
+    phone) reach the cache within moments. Only users/{uid} documents are
+    watched, not their videos. Its first snapshot holds every user, which
+    costs one read each when the listener starts.
+    """
+
+    def __init__(self, repository, client=None):
+        self.repository = repository
+        self.watch = (client or db()).collection('users').on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        for change in changes:
+            self.repository.invalidate(change.document.id)
+
+    def close(self):
+        self.watch.unsubscribe()
+
+
+class VideoRepository:
+    """users/{uid}/videos documents."""
+
+    def __init__(self, client=None):
+        self.client = client
+
+    def _collection(self, uid):
+        return (self.client or db()).collection('users').document(uid).collection('videos')
+
+    def new_ref(self, uid):
+        # Document ids are generated locally, so the job id is known before
+        # anything is written.
+        return self._collection(uid).document()
+
+    def enqueue(self, video_ref, file_path, content_hash=None, time_stored=firestore.SERVER_TIMESTAMP):
+        data = {
+            'file_path': file_path,
+            'time_stored': time_stored,
+            'status': 'pending',
+        }
+        if content_hash:
+            data['content_hash'] = content_hash
+        with FIRESTORE_SECONDS.time(operation="add_video"):
+            video_ref.set(data)
+        return video_ref
+
+    def fail(self, video_ref, file_path, error):
+        # Leaves a visible record for a job id the client was already given.
+        with FIRESTORE_SECONDS.time(operation="fail_video"):
+            video_ref.set({'file_path': file_path, 'time_stored': firestore.SERVER_TIMESTAMP, 'status': 'failed',
+                           'error': error})
+
+    def pending_count(self):
+        """Videos waiting for a worker, across all users."""
+        query = (self.client or db()).collection_group('videos').where('status', '==', 'pending')
+        with FIRESTORE_SECONDS.time(operation="count_pending"):
+            result = query.count().get()
+        return int(result[0][0].value)
+
+    def recent(self, uid, limit=1):
+        """The user's most recently stored video documents as dicts, newest first."""
+        query = self._collection(uid).order_by('time_stored', direction=firestore.Query.DESCENDING).limit(limit)
+        with FIRESTORE_SECONDS.time(operation="latest_video"):
+            return [doc.to_dict() for doc in query.stream()]
+
+    def latest(self, uid):
+        """The most recently stored video document as a dict, or None."""
+        docs = self.recent(uid, 1)
+        return docs[0] if docs else None
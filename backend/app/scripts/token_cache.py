@@ -0,0 +1,49 @@
+import hashlib
+import time
+
+import metrics
+from ttl_cache import TTLCache
+
+LOOKUPS = metrics.counter("verify_token_cache_total", "Verified-token cache lookups, by outcome.", ["result"])
+
+
+def token_key(token):
+    # Tokens are bearer credentials, so only their hash is kept in memory.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    LRU cache of decoded Firebase ID tokens, keyed by the token's hash.
+
+    An entry lives for at most max_ttl seconds and never past the token's
+    own exp claim. revoke_token() and revoke_user() drop entries early, e.g.
+    after a sign-out or auth.revoke_refresh_tokens(). Safe to share
+    between request threads.
+    """
+
+    def __init__(self, max_entries=10000, max_ttl=300, clock=time.time):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.entries = TTLCache(max_entries, max_ttl, clock)
+
+    def get(self, token):
+        decoded = self.entries.get(token_key(token))
+        if decoded is None:
+            LOOKUPS.inc(result="miss")
+            return None
+        LOOKUPS.inc(result="hit")
+        return dict(decoded)
+
+    def put(self, token, decoded):
+        self.entries.put(token_key(token), dict(decoded), expires=decoded.get("exp"))
+
+    def revoke_token(self, token):
+        self.entries.pop(token_key(token))
+
+    def revoke_user(self, uid):
+        """Drops every cached token of uid; returns how many were removed."""
+        return self.entries.remove_if(lambda key, decoded: decoded.get("uid") == uid)
+
+    def clear(self):
+        self.entries.clear()
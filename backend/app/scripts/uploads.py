@@ -0,0 +1,91 @@
+import itertools
+import os
+import tempfile
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+# Bytes read from the request body per step.
+READ_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    pass
+
+
+def iter_request_body(stream, read_size=READ_SIZE):
+    while True:
+        chunk = stream.read(read_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_multipart_file(stream, boundary, field_name, read_size=READ_SIZE):
+    """
+    Yields the bytes of the file part field_name from a multipart/form-data
+    body as they arrive, without buffering the part or spooling it to disk.
+    """
+    decoder = MultipartDecoder(boundary.encode())
+    in_file = found = complete = False
+    # None tells the decoder the body has ended, which flushes the final events.
+    for chunk in itertools.chain(iter_request_body(stream, read_size), [None]):
+        decoder.receive_data(chunk)
+        event = _next_event(decoder)
+        while not isinstance(event, NeedData):
+            if isinstance(event, File):
+                in_file = event.name == field_name and bool(event.filename)
+                found = found or in_file
+            elif isinstance(event, Data):
+                if in_file and event.data:
+                    yield event.data
+                if not event.more_data:
+                    in_file = False
+            elif isinstance(event, Epilogue):
+                complete = True
+                break
+            event = _next_event(decoder)
+        if complete:
+            break
+    if not found:
+        raise UploadError(f"No '{field_name}' file in the request")
+    if not complete:
+        # The body ended before the closing boundary: the client went away
+        # mid-upload and the clip is truncated.
+        raise UploadError("Incomplete multipart body")
+
+
+def _next_event(decoder):
+    try:
+        return decoder.next_event()
+    except ValueError as e:
+        raise UploadError(f"Malformed multipart body: {e}")
+
+
+def iter_upload(request, field_name="video"):
+    """Upload bytes from either a multipart form (field field_name) or a raw request body."""
+    mimetype, options = parse_options_header(request.headers.get("Content-Type", ""))
+    if mimetype == "multipart/form-data":
+        if "boundary" not in options:
+            raise UploadError("Missing multipart boundary")
+        return iter_multipart_file(request.stream, options["boundary"], field_name)
+    return iter_request_body(request.stream)
+
+
+def save_upload(chunks, max_bytes, suffix=".mov"):
+    """Writes upload chunks to a temporary file and returns its path; the caller deletes it."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f"Upload is larger than {max_bytes} bytes")
+                f.write(chunk)
+        if size == 0:
+            raise UploadError("Empty upload")
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
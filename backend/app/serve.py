@@ -0,0 +1,30 @@
+"""
+Serves the Flask app on gevent, where each open connection is a greenlet
+rather than an OS thread, so thousands of phones can hold /results/stream
+or /results/poll open at once. Run from this directory:
+
+    python serve.py
+
+/analyze runs the model on real threads, which would stall the event loop,
+so it is off here unless ANALYZE_ENABLED is set; serve it from a separate
+`python __init__.py` process.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+# Firestore listener callbacks arrive on gRPC threads; this makes gRPC run
+# them as greenlets so they can hand events to the connections.
+import grpc.experimental.gevent as grpc_gevent
+grpc_gevent.init_gevent()
+
+import os, sys
+from gevent.pywsgi import WSGIServer
+
+os.environ.setdefault("ANALYZE_ENABLED", "0")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", "5000"))
+    print(f"Serving on 0.0.0.0:{port} (gevent)")
+    WSGIServer(("0.0.0.0", port), app).serve_forever()
@@ -0,0 +1,90 @@
+import numpy as np
+
+# Every backend takes (N, H, W, 3) uint8 BGR frames and returns the three
+# heads in this order, each as an (N, classes) array.
+OUTPUT_NAMES = ["alertness", "yawn", "eyes"]
+
+# Model input resolution. Defined here rather than in preprocessing.py so
+# that importing it does not pull in TensorFlow.
+INPUT_SIZE = (128, 128)
+
+
+def configure_tf_threads(tf, num_threads):
+    # Must run before TensorFlow executes its first op in this process.
+    if num_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+class KerasBackend:
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+        from preprocessing import with_preprocessing
+        configure_tf_threads(tf, num_threads)
+        self.model = with_preprocessing(tf.keras.models.load_model(model_path))
+
+    def predict(self, batch):
+        return [np.asarray(p) for p in self.model.predict_on_batch(batch)]
+
+
+class SavedModelBackend:
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+        configure_tf_threads(tf, num_threads)
+        self._tf = tf
+        self.model = tf.saved_model.load(model_path)
+        self.serve = self.model.signatures["serving_default"]
+
+    def predict(self, batch):
+        outputs = self.serve(frames=self._tf.constant(batch, dtype=self._tf.uint8))
+        return [outputs[name].numpy() for name in OUTPUT_NAMES]
+
+
+class TFLiteBackend:
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        # The signature runner resizes the input tensor whenever the batch size changes.
+        self.runner = self.interpreter.get_signature_runner("serving_default")
+
+    def predict(self, batch):
+        outputs = self.runner(frames=np.asarray(batch, dtype=np.uint8))
+        return [outputs[name] for name in OUTPUT_NAMES]
+
+
+class OnnxBackend:
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.uint8)
+        return self.session.run(OUTPUT_NAMES, {self.input_name: batch})
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "savedmodel": SavedModelBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def load_backend(name, model_path, num_threads=None):
+    # A .h5 path with a non-Keras backend loads the converted artifact from
+    # the model cache, converting it once if needed.
+    from model_cache import cached_model_path
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](cached_model_path(model_path, name), num_threads=num_threads)
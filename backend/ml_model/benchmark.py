@@ -0,0 +1,215 @@
+"""
+Throughput benchmarks for the detector and the video worker.
+
+Runs without the trained weights or Firebase credentials: videos are
+synthetic, the model is randomly initialised with the same three-head
+signature as multi_task_drowsiness_model.h5, and the worker job runs
+against fakes.FakeFirestore and fakes.FakeBucket. Results are printed (or
+written) as JSON.
+
+    python benchmark.py --width 640 --height 480 --fps 30 --seconds 10 --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+
+def make_synthetic_video(path, width=640, height=480, fps=30, seconds=10, seed=0):
+    """Writes a video of a moving, noisy face-sized blob so that consecutive frames differ like real footage."""
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    background = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    radius = max(4, min(width, height) // 6)
+    for i in range(int(fps * seconds)):
+        frame = background.copy()
+        x = int(width / 2 + width / 4 * np.sin(i / fps))
+        y = int(height / 2 + height / 6 * np.cos(i / fps))
+        cv2.circle(frame, (x, y), radius, (90, 140, 200), -1)
+        frame = cv2.add(frame, rng.integers(0, 8, frame.shape, dtype=np.uint8))
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def build_random_model(path, backbone="mobilenet", seed=0):
+    """
+    Saves a randomly initialised model with the trained model's inputs and
+    output heads. backbone="mobilenet" matches the real compute cost;
+    "tiny" is a single conv layer for quick runs.
+    """
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input((128, 128, 3))
+    if backbone == "mobilenet":
+        base = tf.keras.applications.MobileNetV2(include_top=False, input_tensor=inputs, weights=None,
+                                                 pooling="avg")
+        x = base.output
+        heads = {"drowsiness_output": (512, 3), "yawning_output": (256, 3), "blinking_output": (256, 2)}
+    else:
+        x = tf.keras.layers.Conv2D(8, 3, strides=4, activation="relu")(inputs)
+        x = tf.keras.layers.GlobalAveragePooling2D()(x)
+        heads = {"drowsiness_output": (16, 3), "yawning_output": (16, 3), "blinking_output": (16, 2)}
+
+    outputs = []
+    for name, (units, classes) in heads.items():
+        fc = tf.keras.layers.Dense(units, activation="relu")(x)
+        outputs.append(tf.keras.layers.Dense(classes, activation="softmax", name=name)(fc))
+    tf.keras.Model(inputs, outputs).save(path)
+    return path
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def read_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def bench_process_frame(detector, frames, iterations=200, warmup=10):
+    for frame in frames[:warmup]:
+        detector.process_frame(frame)
+    latencies = []
+    for i in range(iterations):
+        frame = frames[i % len(frames)]
+        start = time.perf_counter()
+        detector.process_frame(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    return {
+        "iterations": iterations,
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(np.max(latencies)), 3),
+    }
+
+
+def bench_process_video(detector, video_path, batch_size=16, target_fps=None, repeat=3):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = detector.process_video(video_path, batch_size=batch_size, target_fps=target_fps)
+        elapsed = time.perf_counter() - start
+        runs.append((elapsed, len(results)))
+    elapsed, frames = min(runs)
+    return {
+        "batch_size": batch_size,
+        "target_fps": target_fps,
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "frames_per_second": round(frames / elapsed, 1),
+    }
+
+
+def bench_pending_videos(detector, video_path, jobs=8, batch_size=16, target_fps=15):
+    """Times analyze_pending_videos over jobs pending documents backed by local storage and Firestore stand-ins."""
+    from fakes import FakeBucket, FakeFirestore
+    from implementation import analyze_pending_videos
+
+    db = FakeFirestore()
+    with tempfile.TemporaryDirectory() as root:
+        bucket = FakeBucket(root)
+        for i in range(jobs):
+            bucket.blob(f"videos/bench/{i}.avi").upload_from_filename(video_path)
+            db.document(f"users/bench/videos/{i}").set({"file_path": f"videos/bench/{i}.avi",
+                                                        "status": "pending"})
+
+        start = time.perf_counter()
+        analyze_pending_videos(detector, batch_size=batch_size, target_fps=target_fps, db=db, bucket=bucket)
+        elapsed = time.perf_counter() - start
+
+    completed = [d for d in db.docs.values() if d.get("status") == "complete"]
+    frames = sum(d["results"]["total_frames"] for d in completed)
+    return {
+        "jobs": jobs,
+        "completed": len(completed),
+        "seconds": round(elapsed, 3),
+        "jobs_per_second": round(len(completed) / elapsed, 3),
+        "frames_per_second": round(frames / elapsed, 1),
+    }
+
+
+def run(args):
+    from implementation import DrowsinessDetector
+
+    with tempfile.TemporaryDirectory() as workdir:
+        video_path = make_synthetic_video(os.path.join(workdir, "synthetic.avi"), args.width, args.height,
+                                          args.fps, args.seconds)
+        model_path = args.model or build_random_model(os.path.join(workdir, "random_model.h5"), args.backbone)
+
+        load_start = time.perf_counter()
+        detector = DrowsinessDetector(model_path, backend=args.backend)
+        load_seconds = time.perf_counter() - load_start
+
+        report = {
+            "config": {
+                "width": args.width,
+                "height": args.height,
+                "fps": args.fps,
+                "seconds": args.seconds,
+                "backend": args.backend,
+                "model": args.model or f"random:{args.backbone}",
+            },
+            "environment": {
+                "python": platform.python_version(),
+                "tensorflow": tf.__version__,
+                "opencv": cv2.__version__,
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+            },
+            "model_load_seconds": round(load_seconds, 3),
+            "process_frame": bench_process_frame(detector, read_frames(video_path, 32), args.iterations),
+            "process_video": [bench_process_video(detector, video_path, batch_size)
+                              for batch_size in args.batch_sizes],
+            "process_video_sampled": bench_process_video(detector, video_path, args.batch_sizes[-1],
+                                                         target_fps=15),
+            "analyze_pending_videos": bench_pending_videos(detector, video_path, args.jobs, args.batch_sizes[-1]),
+        }
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the drowsiness detector and video worker.")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--model", help="use this model instead of a random-weight one")
+    parser.add_argument("--backbone", choices=["mobilenet", "tiny"], default="mobilenet")
+    parser.add_argument("--backend", default="keras")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=lambda s: [int(n) for n in s.split(",")], default=[1, 16])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # The detector and worker log progress with print(); keep stdout for the report.
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,177 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import firestore
+
+from pipeline import STAGE_SECONDS, VIDEOS, StageThread
+
+
+def result_blob_name(ref):
+    # Derived from the document path rather than random, so a retried or
+    # repeated commit overwrites the same object instead of adding another.
+    return f"results/{uuid.uuid5(uuid.NAMESPACE_URL, ref.path)}_results.json"
+
+
+def upload_results(bucket, ref, summary):
+    """Uploads the summary JSON as a public object in one request and returns its URL."""
+    blob = bucket.blob(result_blob_name(ref))
+    blob.upload_from_string(json.dumps(summary), content_type="application/json", predefined_acl="publicRead")
+    return blob.public_url
+
+
+def completed_update(summary, json_url, time_stored, queued_at=None):
+    update = {
+        "status": "complete",
+        "results": summary,
+        "result_json_url": json_url,
+        "time_stored": time_stored,
+        "completed_at": firestore.SERVER_TIMESTAMP,
+        "worker_id": None,
+        "lease_expires": None,
+    }
+    # Upload-to-result time, read by the API to pace the phones.
+    if queued_at is not None:
+        update["latency_seconds"] = round(time.time() - queued_at, 3)
+    return update
+
+
+def queued_time(data):
+    """Epoch seconds the video document was stored, if time_stored is a Firestore timestamp."""
+    stored = data.get("time_stored")
+    return stored.timestamp() if hasattr(stored, "timestamp") else None
+
+
+def retry(fn, attempts=3, delay=0.5, sleep=time.sleep):
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            sleep(delay * 2 ** attempt)
+
+
+class _Job:
+    def __init__(self, ref, summary, time_stored, callback, queued_at):
+        self.ref = ref
+        self.summary = summary
+        self.time_stored = time_stored
+        self.callback = callback
+        self.queued_at = queued_at
+        self.update = None
+
+
+class ResultCommitter:
+    """
+    Commits finished videos off the inference thread.
+
+    Result JSON uploads run on a pool of upload_workers threads; the
+    document updates they produce are grouped into Firestore batched writes
+    of up to batch_size, flushed at least every flush_interval seconds. Both
+    steps are retried and are idempotent: the JSON object name is derived
+    from the document path and the update is a merge. At most max_pending
+    videos are waiting to be committed; submit() blocks beyond that.
+
+    callback(error) runs once per video after its update is written, with
+    error set if the commit was given up on.
+    """
+
+    def __init__(self, db, bucket, upload_workers=4, batch_size=20, flush_interval=0.5, max_pending=32,
+                 attempts=3):
+        self.db = db
+        self.bucket = bucket
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.attempts = attempts
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.uploads = ThreadPoolExecutor(upload_workers, thread_name_prefix="result-upload")
+        self.writes = queue.Queue()
+        self.writer = StageThread(self._write_loop, "result-writer")
+        self.writer.start()
+
+    @property
+    def error(self):
+        """Set if the writer thread has died; nothing more will be committed."""
+        return self.writer.error
+
+    def submit(self, ref, summary, time_stored=firestore.SERVER_TIMESTAMP, callback=None, queued_at=None):
+        # Waits for a free slot, but fails instead of blocking forever if the
+        # writer that frees them is gone.
+        while not self.slots.acquire(timeout=0.5):
+            if self.error is not None:
+                raise RuntimeError("Result writer has stopped") from self.error
+        if self.error is not None:
+            self.slots.release()
+            raise RuntimeError("Result writer has stopped") from self.error
+        self.uploads.submit(self._upload, _Job(ref, summary, time_stored, callback, queued_at))
+
+    def _upload(self, job):
+        try:
+            with STAGE_SECONDS.time(stage="upload"):
+                url = retry(lambda: upload_results(self.bucket, job.ref, job.summary), self.attempts)
+        except Exception as e:
+            print(f"Result upload failed for {job.ref.path}: {e}")
+            self._finish([job], e)
+            return
+        job.update = completed_update(job.summary, url, job.time_stored, job.queued_at)
+        self.writes.put(job)
+
+    def _write_loop(self):
+        done = False
+        while not done:
+            job = self.writes.get()
+            if job is None:
+                return
+            jobs = [job]
+            deadline = time.monotonic() + self.flush_interval
+            while len(jobs) < self.batch_size:
+                try:
+                    job = self.writes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    done = True
+                    break
+                jobs.append(job)
+            self._write(jobs)
+
+    def _write(self, jobs):
+        def commit():
+            batch = self.db.batch()
+            for job in jobs:
+                batch.set(job.ref, job.update, merge=True)
+            batch.commit()
+
+        try:
+            with STAGE_SECONDS.time(stage="firestore_write"):
+                retry(commit, self.attempts)
+        except Exception as e:
+            print(f"Result write failed for {len(jobs)} video(s): {e}")
+            self._finish(jobs, e)
+            return
+        self._finish(jobs, None)
+
+    def _finish(self, jobs, error):
+        VIDEOS.inc(len(jobs), status="failed" if error else "complete")
+        for job in jobs:
+            try:
+                if job.callback is not None:
+                    job.callback(error)
+            except Exception as e:
+                # e.g. handing the lease back failed; the lease then expires
+                # and the reclaimer returns the video to the queue.
+                print(f"Commit callback failed for {job.ref.path}: {e}")
+            finally:
+                self.slots.release()
+
+    def close(self):
+        """Waits for every submitted video to be committed."""
+        self.uploads.shutdown(wait=True)
+        self.writes.put(None)
+        self.writer.join()
+        if self.writer.error:
+            raise self.writer.error
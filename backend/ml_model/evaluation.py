@@ -5,6 +5,7 @@ import os
 import cv2
 import matplotlib.pyplot as plt
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, accuracy_score
 import seaborn as sns
 import pandas as pd
@@ -24,7 +25,8 @@ paths = {
 image_size = (128, 128)
 batch_size = 32
 
-datagen = ImageDataGenerator(rescale=1./255)
+# Same normalisation as training.py and the in-graph FramePreprocessing layer
+datagen = ImageDataGenerator(preprocessing_function=preprocess_input)
 
 generators = {
     task: datagen.flow_from_directory(
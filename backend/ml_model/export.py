@@ -0,0 +1,106 @@
+import argparse
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from backends import OUTPUT_NAMES, load_backend
+from preprocessing import with_preprocessing
+
+# Exported models take raw uint8 BGR frames; resizing and normalisation run
+# in the graph (see preprocessing.py).
+INPUT_SPEC = tf.TensorSpec([None, None, None, 3], tf.uint8, name="frames")
+
+
+def _serving_function(model):
+    @tf.function(input_signature=[INPUT_SPEC])
+    def serve(frames):
+        outputs = model(frames, training=False)
+        return dict(zip(OUTPUT_NAMES, outputs))
+    return serve
+
+
+def export_saved_model(model, path):
+    # ExportArchive tracks the Keras variables so the converters below see
+    # them as constants; a bare tf.Module leaves unresolved variable reads.
+    archive = tf.keras.export.ExportArchive()
+    archive.track(model)
+    archive.add_endpoint("serving_default", _serving_function(model))
+    archive.write_out(path)
+    return path
+
+
+def export_tflite(saved_model_path, path):
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_path)
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+def export_onnx(model, path, opset=13):
+    try:
+        import tf2onnx
+    except ImportError:
+        raise RuntimeError("ONNX export requires tf2onnx (pip install tf2onnx)")
+    tf2onnx.convert.from_function(_serving_function(model), input_signature=[INPUT_SPEC],
+                                  opset=opset, output_path=path)
+    return path
+
+
+def export_model(h5_path, out_dir, formats=("savedmodel", "tflite", "onnx")):
+    """
+    Converts the Keras .h5 model into the artifacts loaded by backends.py.
+
+    Returns a dict mapping backend name to artifact path, including the
+    original .h5 under "keras".
+    """
+    model = with_preprocessing(tf.keras.models.load_model(h5_path))
+    os.makedirs(out_dir, exist_ok=True)
+
+    artifacts = {"keras": h5_path}
+    saved_model_path = os.path.join(out_dir, "saved_model")
+    if "savedmodel" in formats or "tflite" in formats:
+        artifacts["savedmodel"] = export_saved_model(model, saved_model_path)
+    if "tflite" in formats:
+        artifacts["tflite"] = export_tflite(saved_model_path, os.path.join(out_dir, "model.tflite"))
+    if "onnx" in formats:
+        artifacts["onnx"] = export_onnx(model, os.path.join(out_dir, "model.onnx"))
+    return artifacts
+
+
+def check_parity(artifacts, frames=None, atol=1e-4, reference="keras"):
+    """
+    Runs every backend on the same batch and compares each head against the
+    reference backend. Returns {backend: max abs difference} and raises
+    AssertionError if any backend is outside the tolerance.
+    """
+    if frames is None:
+        frames = np.random.default_rng(0).integers(0, 256, (8, 240, 320, 3), dtype=np.uint8)
+
+    expected = load_backend(reference, artifacts[reference]).predict(frames)
+    report = {}
+    for name, path in artifacts.items():
+        if name == reference:
+            continue
+        actual = load_backend(name, path).predict(frames)
+        report[name] = max(float(np.max(np.abs(a - e))) for a, e in zip(actual, expected))
+
+    failed = {name: diff for name, diff in report.items() if diff > atol}
+    if failed:
+        raise AssertionError(f"Backends disagree with {reference} beyond atol={atol}: {failed}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the drowsiness model to SavedModel, TFLite and ONNX.")
+    parser.add_argument("model", nargs="?", default="multi_task_drowsiness_model.h5")
+    parser.add_argument("--out", default="exported_model")
+    parser.add_argument("--formats", default="savedmodel,tflite,onnx")
+    parser.add_argument("--atol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    artifacts = export_model(args.model, args.out, formats=args.formats.split(","))
+    for name, path in artifacts.items():
+        print(f"{name}: {path}")
+    for name, diff in check_parity(artifacts, atol=args.atol).items():
+        print(f"{name} max abs diff vs keras: {diff:.2e}")
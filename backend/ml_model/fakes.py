@@ -0,0 +1,254 @@
+"""
+In-process stand-ins for the parts of the Firestore and Cloud Storage
+clients the worker uses.
+
+FakeFirestore keeps documents in a dict keyed by path and supports enough of
+the API (documents, collections, collection groups, equality/inequality
+queries, merge writes, batches and transactions) to run the worker code
+paths locally without credentials. FakeBucket stores blobs as files under a
+local directory.
+"""
+import copy
+import os
+import shutil
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import firebase_admin.firestore as firestore_module
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+def _resolve(value):
+    if value is firestore_module.SERVER_TIMESTAMP:
+        return time.time()
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    return copy.deepcopy(value)
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return FakeCollectionReference(self._db, f"{self.path}/{name}")
+
+    def get(self, transaction=None):
+        with self._db.lock:
+            return FakeDocumentSnapshot(self, copy.deepcopy(self._db.docs.get(self.path)))
+
+    def set(self, data, merge=False):
+        with self._db.lock:
+            self._db._write(self.path, data, merge)
+
+    def update(self, data):
+        with self._db.lock:
+            if self.path not in self._db.docs:
+                raise KeyError(f"No document to update: {self.path}")
+            self._db._write(self.path, data, merge=True)
+
+    def delete(self):
+        with self._db.lock:
+            self._db.docs.pop(self.path, None)
+
+
+class FakeQuery:
+    def __init__(self, db, matches, filters=(), order=None, limit=None):
+        self._db = db
+        self._matches = matches
+        self._filters = list(filters)
+        self._order = order
+        self._limit = limit
+
+    def where(self, field, op, value):
+        return FakeQuery(self._db, self._matches, self._filters + [(field, _OPERATORS[op], value)], self._order,
+                         self._limit)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return FakeQuery(self._db, self._matches, self._filters, (field, direction), self._limit)
+
+    def limit(self, count):
+        return FakeQuery(self._db, self._matches, self._filters, self._order, count)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def count(self):
+        return FakeAggregationQuery(self)
+
+    def stream(self, transaction=None):
+        with self._db.lock:
+            snapshots = [FakeDocumentSnapshot(FakeDocumentReference(self._db, path), copy.deepcopy(data))
+                         for path, data in self._db.docs.items()
+                         if self._matches(path) and all(op(data.get(f), v) for f, op, v in self._filters)]
+        if self._order:
+            field, direction = self._order
+            snapshots.sort(key=lambda s: s.get(field), reverse=str(direction).upper().endswith("DESCENDING"))
+        return iter(snapshots[:self._limit] if self._limit is not None else snapshots)
+
+
+class FakeAggregationQuery:
+    """query.count(): get() returns [[result]] with the count in result.value, as Firestore does."""
+
+    def __init__(self, query):
+        self._query = query
+
+    def get(self, transaction=None):
+        return [[SimpleNamespace(alias="count", value=len(self._query.get()))]]
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db, path):
+        depth = path.count("/")
+        super().__init__(db, lambda p: p.rsplit("/", 1)[0] == path and p.count("/") == depth + 1)
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._db, f"{self.path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+class FakeWriteBatch:
+    """Buffers writes and applies them atomically on commit(), like firestore.WriteBatch."""
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference.path, data, merge))
+
+    def update(self, reference, data):
+        self._writes.append((reference.path, data, True))
+
+    def commit(self):
+        with self._db.lock:
+            for path, data, merge in self._writes:
+                self._db._write(path, data, merge)
+            self._db.commits += 1
+        self._writes = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    pass
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.RLock()
+        self.commits = 0
+
+    def _write(self, path, data, merge):
+        data = _resolve(data)
+        if merge and path in self.docs:
+            self.docs[path].update(data)
+        else:
+            self.docs[path] = data
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def document(self, path):
+        return FakeDocumentReference(self, path)
+
+    def collection_group(self, name):
+        return FakeQuery(self, lambda p: p.rsplit("/", 2)[-2] == name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def run_transaction(self, fn, *args):
+        # The real client retries optimistic transactions on contention; here
+        # the whole function runs under the database lock, which gives the
+        # same all-or-nothing outcome for in-process tests.
+        with self.lock:
+            transaction = FakeTransaction(self)
+            result = fn(transaction, *args)
+            transaction.commit()
+            return result
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.root, name)
+        self.public_url = f"file://{self.path}"
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def reload(self):
+        if not self.exists():
+            raise FileNotFoundError(self.name)
+
+    def download_to_filename(self, filename):
+        shutil.copyfile(self.path, filename)
+
+    def upload_from_filename(self, filename, content_type=None, predefined_acl=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        shutil.copyfile(filename, self.path)
+
+    def upload_from_string(self, data, content_type=None, predefined_acl=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(data.encode() if isinstance(data, str) else data)
+
+    def make_public(self):
+        pass
+
+    def delete(self):
+        os.unlink(self.path)
+
+
+class FakeBucket:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        blob = FakeBlob(self, name)
+        return blob if blob.exists() else None
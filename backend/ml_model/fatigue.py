@@ -0,0 +1,241 @@
+import numpy as np
+
+from results import ALERTNESS_LABELS, FrameResults
+
+
+class RingBuffer:
+    """
+    Fixed-width columns in a circular numpy buffer. push() and popleft() are
+    O(1); the buffer doubles in place if a window ever holds more rows than
+    it was sized for.
+    """
+
+    def __init__(self, columns, capacity=1024):
+        self.capacity = capacity
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in columns.items()}
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        order = (self.start + np.arange(self.size)) % self.capacity
+        self.capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty(self.capacity, dtype=column.dtype)
+            grown[:self.size] = column[order]
+            self.columns[name] = grown
+        self.start = 0
+
+    def push(self, **values):
+        if self.size == self.capacity:
+            self._grow()
+        i = (self.start + self.size) % self.capacity
+        for name, value in values.items():
+            self.columns[name][i] = value
+        self.size += 1
+
+    def first(self, name):
+        return self.columns[name][self.start]
+
+    def popleft(self):
+        row = {name: column[self.start] for name, column in self.columns.items()}
+        self.start = (self.start + 1) % self.capacity
+        self.size -= 1
+        return row
+
+
+def _alertness_level(alertness_scores):
+    # Score-weighted class index: 0 = Alert, 1 = Low Vigilant, 2 = Very Drowsy.
+    return np.asarray(alertness_scores, dtype=np.float64) @ np.arange(len(ALERTNESS_LABELS))
+
+
+def _level_label(level):
+    return ALERTNESS_LABELS[int(np.clip(np.rint(level), 0, len(ALERTNESS_LABELS) - 1))]
+
+
+class FatigueMonitor:
+    """
+    Streaming sliding-window fatigue metrics over per-frame detector output.
+
+    Every update is O(1) amortised: frames and completed events are pushed
+    into ring buffers and evicted once they fall out of the window, with
+    running sums kept alongside. Metrics at time t cover (t - window, t]:
+
+    - perclos: fraction of frames with eyes closed
+    - blink_count / blink_rate_per_min / mean_blink_duration: closed-eye runs
+      no longer than max_blink_seconds, counted when the eyes reopen
+    - long_closures: closed-eye runs longer than max_blink_seconds
+    - yawn_count: yawning runs of at least min_yawn_seconds, where gaps up to
+      yawn_gap_seconds are bridged; counted once the gap has passed
+    - alertness_level: mean score-weighted alertness index (0..2)
+
+    fatigue_metrics() computes the same values for a stored FrameResults in
+    one vectorised pass.
+    """
+
+    def __init__(self, window_seconds=60.0, max_blink_seconds=0.5, min_yawn_seconds=1.0, yawn_gap_seconds=0.5,
+                 capacity=2048):
+        self.window_seconds = window_seconds
+        self.max_blink_seconds = max_blink_seconds
+        self.min_yawn_seconds = min_yawn_seconds
+        self.yawn_gap_seconds = yawn_gap_seconds
+
+        self.frames = RingBuffer({"t": np.float64, "closed": np.int8, "level": np.float64}, capacity)
+        self.blinks = RingBuffer({"t": np.float64, "duration": np.float64}, 256)
+        self.long_closures = RingBuffer({"t": np.float64}, 64)
+        self.yawns = RingBuffer({"t": np.float64}, 64)
+        self.closed_sum = 0
+        self.level_sum = 0.0
+        self.blink_duration_sum = 0.0
+
+        self.closure_start = None
+        self.yawn_start = None
+        self.last_yawn = None
+
+    def update(self, result):
+        """Adds one per-frame result dict and returns the current metrics."""
+        return self.push(result["timestamp"], result["eyes"]["closed"], result["yawn"]["yawning"],
+                         _alertness_level(result["alertness"]["raw_scores"]))
+
+    def update_batch(self, results):
+        """Adds every frame of a FrameResults chunk and returns the metrics after the last one."""
+        n = len(results)
+        levels = _alertness_level(results.alertness_scores[:n])
+        closed = results.eye_idx[:n] == 1
+        yawning = results.yawn_idx[:n] == results.yawn_labels.index("Yawning")
+        metrics = None
+        for i in range(n):
+            metrics = self.push(float(results.timestamps[i]), bool(closed[i]), bool(yawning[i]), float(levels[i]))
+        return metrics
+
+    def push(self, t, closed, yawning, level):
+        # Eye-closure runs end on the first open frame.
+        if closed and self.closure_start is None:
+            self.closure_start = t
+        elif not closed and self.closure_start is not None:
+            duration = t - self.closure_start
+            if duration <= self.max_blink_seconds:
+                self.blinks.push(t=t, duration=duration)
+                self.blink_duration_sum += duration
+            else:
+                self.long_closures.push(t=t)
+            self.closure_start = None
+
+        # Yawn runs end once more than yawn_gap_seconds pass without a yawning frame.
+        if self.yawn_start is not None and t - self.last_yawn > self.yawn_gap_seconds:
+            if self.last_yawn - self.yawn_start >= self.min_yawn_seconds:
+                self.yawns.push(t=t)
+            self.yawn_start = None
+        if yawning:
+            if self.yawn_start is None:
+                self.yawn_start = t
+            self.last_yawn = t
+
+        self.frames.push(t=t, closed=closed, level=level)
+        self.closed_sum += int(closed)
+        self.level_sum += level
+        self._evict(t)
+        return self.metrics(t)
+
+    def _evict(self, t):
+        cutoff = t - self.window_seconds
+        while len(self.frames) and self.frames.first("t") <= cutoff:
+            row = self.frames.popleft()
+            self.closed_sum -= int(row["closed"])
+            self.level_sum -= row["level"]
+        while len(self.blinks) and self.blinks.first("t") <= cutoff:
+            self.blink_duration_sum -= self.blinks.popleft()["duration"]
+        for events in (self.long_closures, self.yawns):
+            while len(events) and events.first("t") <= cutoff:
+                events.popleft()
+
+    def metrics(self, t):
+        frames = len(self.frames)
+        blinks = len(self.blinks)
+        level = self.level_sum / frames if frames else 0.0
+        return {
+            "timestamp": t,
+            "perclos": self.closed_sum / frames if frames else 0.0,
+            "blink_count": blinks,
+            "blink_rate_per_min": blinks * 60.0 / self.window_seconds,
+            "mean_blink_duration": self.blink_duration_sum / blinks if blinks else 0.0,
+            "long_closures": len(self.long_closures),
+            "yawn_count": len(self.yawns),
+            "alertness_level": level,
+            "alertness_label": _level_label(level),
+        }
+
+
+def _window_counts(event_times, timestamps, window_seconds):
+    # Number of events with time in (t - window, t] for every t.
+    event_times = np.asarray(event_times, dtype=np.float64)
+    hi = np.searchsorted(event_times, timestamps, side="right")
+    lo = np.searchsorted(event_times, timestamps - window_seconds, side="right")
+    return lo, hi
+
+
+def fatigue_metrics(results, window_seconds=60.0, max_blink_seconds=0.5, min_yawn_seconds=1.0,
+                    yawn_gap_seconds=0.5):
+    """
+    Vectorised counterpart of FatigueMonitor over a stored FrameResults (or
+    list of result dicts). Returns a dict of per-frame arrays holding the
+    metrics FatigueMonitor would have reported after each frame.
+    """
+    if not isinstance(results, FrameResults):
+        results = FrameResults.from_dicts(results)
+    n = len(results)
+    t = results.timestamps[:n]
+    closed = results.eye_idx[:n] == 1
+    yawning = results.yawn_idx[:n] == results.yawn_labels.index("Yawning")
+    levels = _alertness_level(results.alertness_scores[:n])
+
+    # Frames in the window.
+    lo, hi = _window_counts(t, t, window_seconds)
+    frames = hi - lo
+    closed_cum = np.concatenate([[0], np.cumsum(closed)])
+    level_cum = np.concatenate([[0.0], np.cumsum(levels)])
+    perclos = (closed_cum[hi] - closed_cum[lo]) / np.maximum(frames, 1)
+    alertness_level = (level_cum[hi] - level_cum[lo]) / np.maximum(frames, 1)
+
+    # Closed-eye runs, completed at the first open frame.
+    edges = np.diff(np.concatenate([[0], closed.astype(np.int8)]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    starts = starts[:len(ends)]
+    durations = t[ends] - t[starts]
+    is_blink = durations <= max_blink_seconds
+    blink_times, blink_durations = t[ends][is_blink], durations[is_blink]
+    long_times = t[ends][~is_blink]
+
+    b_lo, b_hi = _window_counts(blink_times, t, window_seconds)
+    blink_count = b_hi - b_lo
+    duration_cum = np.concatenate([[0.0], np.cumsum(blink_durations)])
+    mean_blink_duration = (duration_cum[b_hi] - duration_cum[b_lo]) / np.maximum(blink_count, 1)
+    l_lo, l_hi = _window_counts(long_times, t, window_seconds)
+
+    # Yawn runs: consecutive yawning frames split wherever the gap exceeds
+    # yawn_gap_seconds, reported at the first frame after the gap.
+    yawn_t = t[yawning]
+    if len(yawn_t):
+        breaks = np.flatnonzero(np.diff(yawn_t) > yawn_gap_seconds)
+        seg_start = yawn_t[np.concatenate([[0], breaks + 1])]
+        seg_end = yawn_t[np.concatenate([breaks, [len(yawn_t) - 1]])]
+        detected = np.searchsorted(t, seg_end + yawn_gap_seconds, side="right")
+        keep = (detected < n) & (seg_end - seg_start >= min_yawn_seconds)
+        yawn_times = t[detected[keep]]
+    else:
+        yawn_times = np.empty(0)
+    y_lo, y_hi = _window_counts(yawn_times, t, window_seconds)
+
+    return {
+        "timestamp": t.copy(),
+        "perclos": perclos,
+        "blink_count": blink_count,
+        "blink_rate_per_min": blink_count * 60.0 / window_seconds,
+        "mean_blink_duration": mean_blink_duration,
+        "long_closures": l_hi - l_lo,
+        "yawn_count": y_hi - y_lo,
+        "alertness_level": alertness_level,
+    }
@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+
+class ChangeGate:
+    """
+    Decides whether a frame is close enough to the last inferred frame to
+    reuse its prediction.
+
+    Frames are compared as small grayscale thumbnails by mean absolute
+    difference (0 = identical, 1 = black vs white). A frame is reused when the
+    difference is below threshold, but never more than max_reuse frames in a
+    row, so predictions are refreshed even on a perfectly static scene.
+    """
+
+    def __init__(self, threshold=0.02, max_reuse=15, size=(32, 32)):
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.size = tuple(size)
+        self.reset()
+
+    def reset(self):
+        # Called at the start of every video; the hit rate is per video.
+        self.reference = None
+        self.reused_in_row = 0
+        self.hits = 0
+        self.total = 0
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def score(self, thumbnail):
+        return float(np.mean(np.abs(thumbnail - self.reference))) / 255.0
+
+    def reuse(self, frame):
+        """Returns True if frame can reuse the last prediction; otherwise it becomes the new reference."""
+        self.total += 1
+        thumbnail = self._thumbnail(frame)
+        if (self.reference is not None and self.reused_in_row < self.max_reuse
+                and self.score(thumbnail) < self.threshold):
+            self.reused_in_row += 1
+            self.hits += 1
+            return True
+
+        self.reference = thumbnail
+        self.reused_in_row = 0
+        return False
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.total if self.total else 0.0
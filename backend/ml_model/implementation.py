@@ -1,45 +1,79 @@
-import tensorflow as tf
 import numpy as np
-import cv2, time, os, json, time
-from uuid import uuid4
-import matplotlib.pyplot as plt
+import cv2, time, os, time
 import firebase_admin
 from firebase_admin import credentials, firestore, storage
-import tempfile
+from backends import INPUT_SIZE, load_backend
+from pipeline import STAGE_SECONDS, VIDEOS, FrameDecoder, FrameEncoder
+from sampler import FrameSampler
+from gating import ChangeGate
+from intake import FallbackIntake, pending_videos_query
+from leases import LeaseHeartbeat, Reclaimer, claim_video, default_worker_id, fail_video, release_video
+from prefetch import Prefetcher, download_video
+from result_cache import FirestoreResultCache, video_cache_key
+from model_cache import model_version
+from committer import ResultCommitter, completed_update, queued_time, upload_results
+from sinks import FrameAnnotator, VideoWriterSink, DisplaySink
+from results import ALERTNESS_LABELS, YAWN_LABELS, EYE_LABELS, FrameResults, OnlineSummary
+import metrics
+
+class UnreadableVideoError(ValueError):
+    """The file could not be opened as a video; retrying will not help."""
+
+
+FRAMES = metrics.counter("drowsiness_frames_total", "Frames analysed, by whether the model ran or reused a prediction.",
+                         ["kind"])
 
 class DrowsinessDetector:
-    def __init__(self, model_path):
+    def __init__(self, model_path, backend="keras", gate=None, num_threads=None):
         try:
-            self.model = tf.keras.models.load_model(model_path)
+            self.backend = load_backend(backend, model_path, num_threads=num_threads)
             # print("Model loaded successfully.")
             # self.model.summary()
         except Exception as e:
             raise RuntimeError(f"Failed to load model from {model_path}: {e}")
 
-        self.alertness_labels = ["Alert", "Low Vigilant", "Very Drowsy"]
-        self.yawn_labels = ["Normal", "Talking", "Yawning"]
-        self.eye_labels = ["Eyes Open", "Eyes Closed"]
+        self.alertness_labels = list(ALERTNESS_LABELS)
+        self.yawn_labels = list(YAWN_LABELS)
+        self.eye_labels = list(EYE_LABELS)
+        self._batch_buffer = None
+        self.annotator = FrameAnnotator()
+        # Optional gating.ChangeGate: near-static frames reuse the previous
+        # prediction instead of running the model.
+        self.gate = gate
+        self._last_scores = None
+        # Identifies the weights in result cache keys.
+        self.model_version = model_version(model_path)
+
+    def warm_up(self, batch_sizes=(1,), frame_size=(480, 640)):
+        # The first calls trace and allocate the model graph for each batch
+        # shape; doing it here keeps that cost off the first real video.
+        # Calls the backend directly so warm-up frames are not counted.
+        for n in batch_sizes:
+            frames = np.zeros((n,) + frame_size + (3,), dtype=np.uint8)
+            self.backend.predict(self.preprocess_batch(frames))
+        return self
 
     def preprocess_frame(self, frame):
-        resized = cv2.resize(frame, (128, 128))
-        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-        normalized = rgb / 255.0
-        return np.expand_dims(normalized, axis=0)
-
-    def process_frame(self, frame):
-        preprocessed = self.preprocess_frame(frame)
-        predictions = self.model.predict(preprocessed, verbose=0)
-
-        alertness_scores = predictions[0][0]
-        yawn_scores = predictions[1][0]
-        eye_scores = predictions[2][0]
-
+        return self.preprocess_batch([frame])
+
+    def preprocess_batch(self, frames):
+        # Only the downscale happens here, straight into a reused uint8
+        # buffer; colour swap and normalisation run inside the model graph.
+        n = len(frames)
+        if self._batch_buffer is None or len(self._batch_buffer) < n:
+            self._batch_buffer = np.empty((n,) + INPUT_SIZE + (3,), dtype=np.uint8)
+        for i, frame in enumerate(frames):
+            cv2.resize(frame, INPUT_SIZE, dst=self._batch_buffer[i])
+        return self._batch_buffer[:n]
+
+    def build_result(self, alertness_scores, yawn_scores, eye_scores, timestamp=None, reused=False):
         alertness_idx = np.argmax(alertness_scores)
         yawn_idx = np.argmax(yawn_scores)
         eye_idx = np.argmax(eye_scores)
 
         return {
-            "timestamp": time.time(),
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "reused": reused,
             "alertness": {
                 "label": self.alertness_labels[alertness_idx],
                 "index": alertness_idx,
@@ -60,119 +94,196 @@ class DrowsinessDetector:
             }
         }
 
-    def annotate_frame(self, frame, results):
-        annotated = frame.copy()
-        h, w = annotated.shape[:2]
-
-        overlay = annotated.copy()
-        cv2.rectangle(overlay, (0, 0), (w, 150), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.6, annotated, 0.4, 0, annotated)
+    def predict_batch(self, frames):
+        # One model call for the whole batch; the three heads come back as
+        # (N, classes) arrays.
+        with STAGE_SECONDS.time(stage="preprocess"):
+            batch = self.preprocess_batch(frames)
+        FRAMES.inc(len(frames), kind="inferred")
+        with STAGE_SECONDS.time(stage="inference"):
+            return self.backend.predict(batch)
+
+    def predict_gated(self, frames):
+        # Runs the model only on frames the gate lets through. A reused
+        # frame takes the scores of the last inferred frame before it, which
+        # may be the carried-over prediction from an earlier batch (row -1).
+        sources = []
+        inferred = []
+        reused = np.zeros(len(frames), dtype=bool)
+        with STAGE_SECONDS.time(stage="gate"):
+            for i, frame in enumerate(frames):
+                if self.gate.reuse(frame):
+                    reused[i] = True
+                    sources.append(len(inferred) - 1)
+                else:
+                    sources.append(len(inferred))
+                    inferred.append(frame)
+        FRAMES.inc(int(reused.sum()), kind="reused")
+
+        previous = self._last_scores
+        if inferred:
+            heads = self.predict_batch(inferred)
+            self._last_scores = [np.array(head[-1]) for head in heads]
+        else:
+            heads = [np.empty((0, len(scores)), dtype=np.float32) for scores in previous]
+
+        rows = np.asarray(sources)
+        outputs = []
+        for h, head in enumerate(heads):
+            table = head if previous is None else np.concatenate([head, previous[h][np.newaxis]])
+            outputs.append(table[rows])
+        return outputs, reused
+
+    def process_batch(self, frames, timestamps=None):
+        if not frames:
+            return []
+        if timestamps is None:
+            timestamps = [None] * len(frames)
+        alertness, yawn, eyes = self.predict_batch(frames)
+        return [self.build_result(alertness[i], yawn[i], eyes[i], timestamps[i]) for i in range(len(frames))]
 
-        cv2.putText(annotated, f"Alertness: {results['alertness']['label']} ({results['alertness']['confidence']:.2f})",
-                    (20, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-
-        eye_color = (0, 0, 255) if results['eyes']['closed'] else (0, 255, 0)
-        cv2.putText(annotated, f"Eyes: {results['eyes']['label']} ({results['eyes']['confidence']:.2f})",
-                    (20, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, eye_color, 2)
+    def process_frame(self, frame):
+        return self.process_batch([frame])[0]
 
-        yawn_color = (0, 0, 255) if results['yawn']['yawning'] else (0, 255, 0)
-        cv2.putText(annotated, f"Yawn: {results['yawn']['label']} ({results['yawn']['confidence']:.2f})",
-                    (20, 110), cv2.FONT_HERSHEY_SIMPLEX, 0.7, yawn_color, 2)
+    def annotate_frame(self, frame, results):
+        return self.annotator.annotate(frame.copy(), results)
+
+    def process_video(self, video_path, output_path=None, display=False, sample_rate=1, max_frames=None, batch_size=1,
+                      queue_size=4, target_fps=None, sinks=None):
+        cap = self._open_video(video_path)
+        expected = self._expected_frames(cap, sample_rate, target_fps, max_frames)
+        results = self.new_results(expected)
+        sinks = self._build_sinks(output_path, display, sinks)
+        for batch in self._iter_batches(cap, sinks, sample_rate, max_frames, batch_size, queue_size, target_fps):
+            results.extend(batch)
+        return results
 
-        return annotated
+    def process_video_iter(self, video_path, output_path=None, display=False, sample_rate=1, max_frames=None,
+                           batch_size=1, queue_size=4, target_fps=None, per_batch=False, sinks=None):
+        # Yields each frame's result dict as soon as its batch has been
+        # inferred, or the whole batch as a FrameResults chunk with
+        # per_batch=True. Nothing is retained between batches, so pairing
+        # this with an OnlineSummary keeps memory constant.
+        cap = self._open_video(video_path)
+        sinks = self._build_sinks(output_path, display, sinks)
+        for batch in self._iter_batches(cap, sinks, sample_rate, max_frames, batch_size, queue_size, target_fps):
+            if per_batch:
+                yield batch
+            else:
+                yield from batch
+
+    @staticmethod
+    def _build_sinks(output_path, display, sinks):
+        sinks = list(sinks or [])
+        if output_path:
+            sinks.append(VideoWriterSink(output_path))
+        if display:
+            sinks.append(DisplaySink())
+        return sinks
 
-    def process_video(self, video_path, output_path=None, display=False, sample_rate=1, max_frames=None):
+    def _open_video(self, video_path):
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
-            raise ValueError(f"Could not open video at {video_path}")
+            raise UnreadableVideoError(f"Could not open video at {video_path}")
+        return cap
+
+    def _iter_batches(self, cap, sinks, sample_rate, max_frames, batch_size, queue_size, target_fps):
+        if batch_size < 1:
+            cap.release()
+            raise ValueError("batch_size must be at least 1")
 
         fps = cap.get(cv2.CAP_PROP_FPS)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-        writer = None
-        if output_path:
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        # Decoding, inference and output run as separate stages connected by
+        # bounded queues: the decoder thread reads ahead while the model
+        # runs, and background sinks (the video writer) run on the encoder
+        # thread behind it. With no sinks nothing is annotated at all.
+        sampler = FrameSampler(cap, target_fps=target_fps, sample_rate=sample_rate)
+        decoder = FrameDecoder(sampler, batch_size, max_frames, queue_size)
+        foreground = [sink for sink in sinks if not sink.background]
+        background = [sink for sink in sinks if sink.background]
+        for sink in sinks:
+            sink.open(fps, (width, height))
+        encoder = None
+        if background:
+            encoder = FrameEncoder(lambda item: self._write_sinks(background, *item), queue_size).start()
+
+        if self.gate:
+            self.gate.reset()
+            self._last_scores = None
 
-        results = []
-        frame_count = 0
         processed_frames = 0
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            frame_count += 1
-            if frame_count % sample_rate != 0:
-                continue
-
-            result = self.process_frame(frame)
-            results.append(result)
-
-            annotated = self.annotate_frame(frame, result)
-
-            if writer:
-                writer.write(annotated)
-
-            if display:
-                cv2.imshow("Drowsiness Detection", annotated)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+        decoder.start()
+        try:
+            for frames, timestamps in decoder.batches():
+                batch = self.new_results(len(frames))
+                if self.gate:
+                    heads, reused = self.predict_gated(frames)
+                    batch.append_batch(*heads, timestamps, reused)
+                else:
+                    batch.append_batch(*self.predict_batch(frames), timestamps)
+                processed_frames += len(batch)
+
+                annotated = self._write_sinks(foreground, frames, batch)
+                if encoder:
+                    encoder.submit([(frames, batch, annotated)])
+
+                yield batch
+                if any(sink.stopped for sink in foreground):
                     break
+        finally:
+            decoder.stop()
+            try:
+                if encoder:
+                    encoder.close()
+            finally:
+                cap.release()
+                for sink in sinks:
+                    sink.close()
+
+        message = f"Processed {processed_frames} out of {total_frames} frames ({sampler.grabbed} read, {sampler.decoded} decoded)"
+        if self.gate:
+            message += f", gate hit rate {self.gate.hit_rate:.1%}"
+        print(message + ".")
+
+    def _write_sinks(self, sinks, frames, batch, annotated=False):
+        # Frames are annotated in place at most once, by whichever stage
+        # first has a sink that wants the overlay.
+        if not annotated and any(sink.annotated for sink in sinks):
+            with STAGE_SECONDS.time(stage="annotate"):
+                self.annotator.annotate_batch(frames, batch)
+            annotated = True
+        if sinks:
+            with STAGE_SECONDS.time(stage="sink_write"):
+                for sink in sinks:
+                    sink.write(frames, batch)
+        return annotated
 
-            processed_frames += 1
-            if max_frames and processed_frames >= max_frames:
-                break
-
-        cap.release()
-        if writer:
-            writer.release()
-        if display:
-            cv2.destroyAllWindows()
+    def new_results(self, capacity=256):
+        return FrameResults(capacity, self.alertness_labels, self.yawn_labels, self.eye_labels)
 
-        print(f"Processed {processed_frames} out of {total_frames} frames.")
-        return results
+    @staticmethod
+    def _expected_frames(cap, sample_rate, target_fps, max_frames):
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        expected = total_frames / sample_rate
+        if target_fps and fps:
+            expected = total_frames * min(target_fps / fps, 1.0)
+        if max_frames:
+            expected = min(expected, max_frames)
+        return int(expected) + 1
 
     def analyze_video_results(self, results):
-        if not results:
-            return {"error": "No results to analyze."}
-
-        total = len(results)
-        alertness_labels = [r['alertness']['label'] for r in results]
-        eyes_closed = sum(1 for r in results if r['eyes']['closed'])
-        yawning = sum(1 for r in results if r['yawn']['yawning'])
-
-        alertness_counts = {label: alertness_labels.count(label) for label in self.alertness_labels}
-        alertness_percentages = {k: round(v / total * 100, 2) for k, v in alertness_counts.items()}
-        yawn_labels = [r['yawn']['label'] for r in results]
-        yawn_counts = {label: yawn_labels.count(label) for label in self.yawn_labels}
-        most_common_yawn = max(yawn_counts, key=yawn_counts.get)
-
-
-
-        # # Plot alertness trend
-        # alertness_indices = [self.alertness_labels.index(label) for label in alertness_labels]
-        # plt.figure(figsize=(10, 4))
-        # plt.plot(alertness_indices, label='Alertness Level (0=Alert, 2=Very Drowsy)', color='blue')
-        # plt.title('Alertness Prediction Over Time')
-        # plt.xlabel('Frame Index')
-        # plt.ylabel('Alertness Level')
-        # plt.yticks([0, 1, 2], self.alertness_labels)
-        # plt.grid(True)
-        # plt.legend()
-        # plt.tight_layout()
-        # plt.show()
+        if not isinstance(results, FrameResults):
+            results = FrameResults.from_dicts(results, alertness_labels=self.alertness_labels,
+                                              yawn_labels=self.yawn_labels, eye_labels=self.eye_labels)
+        return results.summary()
 
-        return {
-            "total_frames": total,
-            "eyes_closed_frames": eyes_closed,
-            "yawning_frames": yawning,
-            "alertness_counts": alertness_counts,
-            "alertness_percentages": alertness_percentages,
-            "yawning_state": most_common_yawn
-        }
+    def new_summary(self):
+        return OnlineSummary(self.alertness_labels, self.yawn_labels, self.eye_labels)
 
 def init():
     # print(os.getcwd())
@@ -181,66 +292,166 @@ def init():
         'storageBucket': 'drowsy-app-47252.firebasestorage.app'
     })
 
-def analyze_pending_videos(detector):
+def analyze_pending_videos(detector, batch_size=16, target_fps=15, db=None, bucket=None, cache=None):
+
+    db = db or firestore.client()
+    bucket = bucket or storage.bucket()
+    worker_id = default_worker_id()
 
+    for doc in pending_videos_query(db).stream():
+        analyze_claimed_video(detector, doc, bucket, db, worker_id, batch_size, target_fps, cache=cache)
+
+def run_worker(detector, intake, batch_size=16, target_fps=15, idle_timeout=1.0, prefetch=2,
+               disk_budget=2 * 1024 ** 3, cache=None):
+    # Blocks on the prefetcher instead of re-querying Firestore; the next
+    # videos are claimed and downloaded while the current one is analysed.
     db = firestore.client()
     bucket = storage.bucket()
+    reclaimer = Reclaimer(db)
+    cache_lookup = None
+    if cache is not None:
+        def cache_lookup(data):
+            key = video_cache_key(detector, data, target_fps)
+            return cache.get(key) if key else None
+    prefetcher = Prefetcher(intake, bucket, db, default_worker_id(), depth=prefetch, max_bytes=disk_budget,
+                            idle_timeout=idle_timeout, cache_lookup=cache_lookup).start()
+    # Uploads and Firestore writes happen on the committer's threads; each
+    # video keeps its lease and file until its results are written.
+    committer = ResultCommitter(db, bucket)
+    try:
+        while not prefetcher.closed:
+            reclaimer.maybe_run()
+            if cache is not None:
+                cache.maybe_evict()
+            item = prefetcher.get(timeout=idle_timeout)
+            if item is None:
+                continue
+            # One bad video must not stop the worker: it is logged and handed
+            # back (or failed outright if it is not a video at all). Only
+            # shutdown and a dead committer end the loop.
+            try:
+                analyze_video(detector, item.doc, bucket, batch_size, target_fps, lease=item.lease,
+                              video_path=item.path, committer=committer,
+                              on_commit=lambda error, item=item: item.done(failed=error is not None),
+                              cache=cache, summary=item.summary)
+            except UnreadableVideoError as e:
+                print(f"Giving up on {item.doc.reference.path}: {e}")
+                _finish_quietly(item, permanent=True)
+            except Exception as e:
+                if committer.error is not None:
+                    _finish_quietly(item, aborted=True)
+                    raise
+                print(f"Analysis failed for {item.doc.reference.path}: {e}")
+                _finish_quietly(item, failed=True)
+            except BaseException:
+                _finish_quietly(item, aborted=True)
+                raise
+    finally:
+        committer.close()
+        prefetcher.close()
+
+def _finish_quietly(item, **outcome):
+    try:
+        item.done(**outcome)
+    except Exception as e:
+        print(f"Could not hand back {item.doc.reference.path}: {e}")
+
+def _summarize_video(detector, bucket, file_path, video_path, batch_size, target_fps):
+    # Without a prefetched file the video is downloaded here and deleted as
+    # soon as inference is done.
+    downloaded = video_path is None
+    if downloaded:
+        blob = bucket.get_blob(file_path)
+        if blob is None:
+            return None
+        with STAGE_SECONDS.time(stage="download"):
+            video_path = download_video(blob)
 
-    videos_ref = db.collection_group("videos")
-    pending_videos = videos_ref.where("status", "==", "pending").stream()
-
-    for doc in pending_videos:
-        print("you are here")
-        data = doc.to_dict()
-        file_path = data["file_path"]
+    try:
+        with STAGE_SECONDS.time(stage="analyze"):
+            summary = detector.new_summary()
+            for batch in detector.process_video_iter(video_path, target_fps=target_fps, batch_size=batch_size,
+                                                     per_batch=True):
+                summary.update(batch)
+            return summary.summary()
+    finally:
+        if downloaded:
+            os.unlink(video_path)
+
+def analyze_claimed_video(detector, doc, bucket, db, worker_id, batch_size=16, target_fps=15, lease_seconds=120,
+                          cache=None):
+    # Claim first so that other workers seeing the same pending document skip
+    # it; the lease is renewed while the video is analysed and handed back to
+    # the queue if the analysis fails.
+    if not claim_video(db, doc.reference, worker_id, lease_seconds):
+        return False
+    try:
+        with LeaseHeartbeat(db, doc.reference, worker_id, lease_seconds) as lease:
+            analyze_video(detector, doc, bucket, batch_size, target_fps, lease=lease, cache=cache)
+    except UnreadableVideoError as e:
+        print(f"Giving up on {doc.reference.path}: {e}")
+        fail_video(db, doc.reference, worker_id)
+        return False
+    except Exception as e:
+        print(f"Analysis failed for {doc.reference.path}: {e}")
+        release_video(db, doc.reference, worker_id)
+        return False
+    except BaseException:
+        release_video(db, doc.reference, worker_id, count_attempt=False)
+        raise
+    return True
+
+def analyze_video(detector, doc, bucket, batch_size=16, target_fps=15, lease=None, video_path=None, committer=None,
+                  on_commit=None, cache=None, summary=None):
+    data = doc.to_dict()
+    file_path = data["file_path"]
+
+    # Duplicate uploads (same content hash, model and sampling) reuse the
+    # cached summary. A prefetched video may already carry one; if not, the
+    # cache is checked again here since a duplicate queued just ahead of it
+    # may have finished after it was prefetched.
+    key = video_cache_key(detector, data, target_fps) if cache is not None else None
+    if summary is None and key:
+        summary = cache.get(key)
+    if summary is not None:
+        print(f"Reusing cached results for: {file_path}")
+    else:
         print(f"Processing video: {file_path}")
-
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-            temp_filename = temp_file.name
-
-        blob = bucket.blob(file_path)
-        if not blob.exists():
-            continue
-
-        blob.download_to_filename(temp_filename)
-        video_path = temp_filename
-
-        results = detector.process_video(video_path, sample_rate=2)
-        summary = detector.analyze_video_results(results)
-
-        json_filename = str(uuid4()) + "_results.json"
-        json_temp = tempfile.NamedTemporaryFile(delete=False, suffix=".json")
-        
-        with open(json_temp.name, "w") as jf:
-            json.dump(summary, jf)
-
-        json_blob = bucket.blob(f"results/{json_filename}")
-        json_blob.upload_from_filename(json_temp.name)
-        json_blob.make_public()
-        json_url = json_blob.public_url
-
-        
-        doc.reference.set({
-            "status": "complete",
-            "results": summary,
-            "result_json_url": json_url,
-            "time_stored": data.get("time_recorded", firestore.SERVER_TIMESTAMP),
-        }, merge=True)
-        
-        # results_summary = {
-        #     "user_id": user_id,
-        #     "video_id": doc.id,
-        #     "timestamp": firestore.SERVER_TIMESTAMP,
-        #     "drowsyCount": alertness_counts.get("Very Drowsy", 0),
-        #     "normalCount": alertness_counts.get("Alert", 0),
-        #     "duration": results.get("duration", 60)  # Optional: include duration
-        # }
-        # analysis_results_ref = db.collection("analysis_results")
-        # analysis_results_ref.add(results_summary)
-
-        # os.unlink(video_path)
-        # os.unlink(json_temp.name)
+        summary = _summarize_video(detector, bucket, file_path, video_path, batch_size, target_fps)
+        if summary is None:
+            return
+        if key:
+            cache.put(key, summary)
+
+    if lease is not None and lease.lost.is_set():
+        print(f"Lease lost for {file_path}, leaving results to the worker that took it over.")
+        if on_commit is not None:
+            on_commit(None)
+        return
+
+    time_stored = data.get("time_recorded", firestore.SERVER_TIMESTAMP)
+    if committer is not None:
+        committer.submit(doc.reference, summary, time_stored, callback=on_commit, queued_at=queued_time(data))
+        return
+
+    with STAGE_SECONDS.time(stage="upload"):
+        json_url = upload_results(bucket, doc.reference, summary)
+    with STAGE_SECONDS.time(stage="firestore_write"):
+        doc.reference.set(completed_update(summary, json_url, time_stored, queued_time(data)), merge=True)
+    VIDEOS.inc(status="complete")
+    if on_commit is not None:
+        on_commit(None)
+
+    # results_summary = {
+    #     "user_id": user_id,
+    #     "video_id": doc.id,
+    #     "timestamp": firestore.SERVER_TIMESTAMP,
+    #     "drowsyCount": alertness_counts.get("Very Drowsy", 0),
+    #     "normalCount": alertness_counts.get("Alert", 0),
+    #     "duration": results.get("duration", 60)  # Optional: include duration
+    # }
+    # analysis_results_ref = db.collection("analysis_results")
+    # analysis_results_ref.add(results_summary)
 
 
 if __name__ == "__main__":
@@ -251,9 +462,48 @@ if __name__ == "__main__":
         except:
             pass
         init()
-        detector = DrowsinessDetector("multi_task_drowsiness_model.h5")
-        while True:
-            analyze_pending_videos(detector)
-            #time.sleep(10)
+        if os.getenv("METRICS_PORT"):
+            metrics.serve_metrics(int(os.getenv("METRICS_PORT")))
+        processes = int(os.getenv("WORKER_PROCESSES", "1"))
+        model_path = os.getenv("DETECTOR_MODEL_PATH", "multi_task_drowsiness_model.h5")
+        backend = os.getenv("DETECTOR_BACKEND", "keras")
+        gate = None
+        if os.getenv("DETECTOR_CHANGE_THRESHOLD"):
+            gate = ChangeGate(threshold=float(os.getenv("DETECTOR_CHANGE_THRESHOLD")),
+                              max_reuse=int(os.getenv("DETECTOR_MAX_REUSE", "15")))
+
+        cache_options = cache = None
+        if os.getenv("RESULT_CACHE", "1") != "0":
+            cache_options = {"max_entries": int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000")),
+                             "max_age": float(os.getenv("RESULT_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600}
+            cache = FirestoreResultCache(firestore.client(), **cache_options)
+
+        # Load and warm the model before taking any work, then report ready.
+        pool = detector = None
+        if processes > 1:
+            from pool import WorkerPool, run_pool
+            threads = os.getenv("WORKER_THREADS")
+            metrics_port = os.getenv("METRICS_PORT")
+            pool = WorkerPool(processes, model_path, backend, num_threads=int(threads) if threads else None,
+                              gate=gate, cache_options=cache_options,
+                              metrics_port=int(metrics_port) if metrics_port else None)
+            pool.wait_ready()
+        else:
+            detector = DrowsinessDetector(model_path, backend=backend, gate=gate).warm_up((1, 16))
+        metrics.set_ready()
+
+        intake = FallbackIntake(firestore.client())
+        try:
+            if pool:
+                try:
+                    run_pool(pool, intake, reclaimer=Reclaimer(firestore.client()), cache=cache)
+                finally:
+                    pool.close()
+            else:
+                run_worker(detector, intake, prefetch=int(os.getenv("WORKER_PREFETCH", "2")),
+                           disk_budget=int(os.getenv("WORKER_DISK_BUDGET_MB", "2048")) * 1024 ** 2, cache=cache)
+        finally:
+            metrics.set_ready(False)
+            intake.close()
     except KeyboardInterrupt:
         print("Process interrupted by user.")
\ No newline at end of file
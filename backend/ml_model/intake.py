@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+
+
+def pending_videos_query(db):
+    return db.collection_group("videos").where("status", "==", "pending")
+
+
+class InMemoryIntake:
+    """In-process job queue with the same get()/close() interface; used as a stand-in in tests."""
+
+    def __init__(self, docs=()):
+        self.queue = queue.Queue()
+        self.closed = False
+        for doc in docs:
+            self.put(doc)
+
+    def put(self, doc):
+        self.queue.put(doc)
+
+    def get(self, timeout=None):
+        """Returns the next pending video document, or None if none arrived within timeout."""
+        if self.closed:
+            return None
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.closed = True
+
+
+class SnapshotIntake(InMemoryIntake):
+    """
+    Pushes pending video documents to the worker from a Firestore snapshot
+    listener, so an idle worker issues no queries at all.
+
+    Each document is delivered once while it stays pending; it can be
+    delivered again only after it has left the pending set.
+    """
+
+    def __init__(self, db):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.delivered = set()
+        self.watch = pending_videos_query(db).on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self.lock:
+            for change in changes:
+                path = change.document.reference.path
+                if change.type.name == "REMOVED":
+                    self.delivered.discard(path)
+                elif path not in self.delivered:
+                    self.delivered.add(path)
+                    self.put(change.document)
+
+    @property
+    def active(self):
+        return not self.closed and self.watch.is_active
+
+    def close(self):
+        super().close()
+        self.watch.unsubscribe()
+
+
+class PollingIntake:
+    """
+    Fallback intake that re-runs the pending query with exponential backoff:
+    the interval doubles after every empty poll up to max_interval and drops
+    back to min_interval as soon as work is found.
+    """
+
+    def __init__(self, db, min_interval=1.0, max_interval=60.0, sleep=time.sleep, clock=time.monotonic):
+        self.db = db
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.sleep = sleep
+        self.clock = clock
+        self.next_poll_at = 0.0
+        self.buffer = []
+        self.closed = False
+
+    def get(self, timeout=None):
+        if self.closed:
+            return None
+        if not self.buffer:
+            # Callers ask with short timeouts; the query itself only runs
+            # once the backoff interval since the last empty poll has passed.
+            remaining = self.next_poll_at - self.clock()
+            if remaining > 0:
+                self.sleep(remaining if timeout is None else min(remaining, timeout))
+                if self.clock() < self.next_poll_at:
+                    return None
+            self.buffer = list(pending_videos_query(self.db).stream())
+            if not self.buffer:
+                self.next_poll_at = self.clock() + self.interval
+                self.interval = min(self.interval * 2, self.max_interval)
+                return None
+            self.interval = self.min_interval
+        return self.buffer.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class FallbackIntake:
+    """Uses the snapshot listener while it is healthy and switches to backoff polling if it fails or stops."""
+
+    def __init__(self, db, **polling_options):
+        self.db = db
+        self.polling_options = polling_options
+        self.intake = None
+        try:
+            self.intake = SnapshotIntake(db)
+        except Exception as e:
+            print(f"Snapshot listener unavailable, polling instead: {e}")
+            self.intake = PollingIntake(db, **polling_options)
+
+    @property
+    def closed(self):
+        return self.intake.closed
+
+    def get(self, timeout=None):
+        if isinstance(self.intake, SnapshotIntake) and not self.intake.active:
+            print("Snapshot listener stopped, polling instead.")
+            self.intake.close()
+            self.intake = PollingIntake(self.db, **self.polling_options)
+        return self.intake.get(timeout=timeout)
+
+    def close(self):
+        self.intake.close()
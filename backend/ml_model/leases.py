@@ -0,0 +1,187 @@
+import os
+import socket
+import threading
+import time
+
+import metrics
+from pipeline import STAGE_SECONDS
+
+LEASES = metrics.counter("drowsiness_leases_total", "Lease operations, by outcome.", ["event"])
+
+PENDING = "pending"
+PROCESSING = "processing"
+FAILED = "failed"
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_transaction(db, fn, *args):
+    """Runs fn(transaction, *args) atomically on a Firestore client or a fakes.FakeFirestore."""
+    if hasattr(db, "run_transaction"):
+        return db.run_transaction(fn, *args)
+    from firebase_admin import firestore
+    return firestore.transactional(fn)(db.transaction(), *args)
+
+
+def _claim(transaction, ref, worker_id, lease_seconds, max_attempts, now):
+    data = ref.get(transaction=transaction).to_dict() or {}
+    status = data.get("status")
+    expired = status == PROCESSING and data.get("lease_expires", 0) < now
+    if status != PENDING and not expired:
+        return False
+
+    attempts = data.get("attempts", 0)
+    if attempts >= max_attempts:
+        transaction.update(ref, {"status": FAILED, "worker_id": None, "lease_expires": None})
+        return False
+
+    transaction.update(ref, {
+        "status": PROCESSING,
+        "worker_id": worker_id,
+        "lease_expires": now + lease_seconds,
+        "attempts": attempts + 1,
+    })
+    return True
+
+
+def claim_video(db, ref, worker_id, lease_seconds=120, max_attempts=3):
+    """
+    Atomically moves a video document from pending (or processing with an
+    expired lease) to processing under worker_id. Returns False if another
+    worker holds it, and marks it failed once max_attempts is used up.
+    """
+    with STAGE_SECONDS.time(stage="claim"):
+        claimed = run_transaction(db, _claim, ref, worker_id, lease_seconds, max_attempts, time.time())
+    LEASES.inc(event="claimed" if claimed else "skipped")
+    return claimed
+
+
+def _renew(transaction, ref, worker_id, lease_seconds, now):
+    data = ref.get(transaction=transaction).to_dict() or {}
+    if data.get("status") != PROCESSING or data.get("worker_id") != worker_id:
+        return False
+    transaction.update(ref, {"lease_expires": now + lease_seconds})
+    return True
+
+
+def renew_lease(db, ref, worker_id, lease_seconds=120):
+    return run_transaction(db, _renew, ref, worker_id, lease_seconds, time.time())
+
+
+def _release(transaction, ref, worker_id, count_attempt, status):
+    data = ref.get(transaction=transaction).to_dict() or {}
+    if data.get("status") != PROCESSING or data.get("worker_id") != worker_id:
+        return False
+    update = {"status": status, "worker_id": None, "lease_expires": None}
+    if not count_attempt:
+        # The claim already counted this attempt; give it back.
+        update["attempts"] = max(data.get("attempts", 0) - 1, 0)
+    transaction.update(ref, update)
+    return True
+
+
+def release_video(db, ref, worker_id, count_attempt=True):
+    """
+    Hands a claimed video back to the pending queue. After a failed analysis
+    the attempt stays counted; with count_attempt=False (shutdown, work
+    abandoned before it started) it does not.
+    """
+    released = run_transaction(db, _release, ref, worker_id, count_attempt, PENDING)
+    if released:
+        LEASES.inc(event="released" if count_attempt else "returned")
+    return released
+
+
+def fail_video(db, ref, worker_id):
+    """Marks a claimed video failed without further attempts, e.g. when the file is not a readable video."""
+    failed = run_transaction(db, _release, ref, worker_id, True, FAILED)
+    if failed:
+        LEASES.inc(event="failed")
+    return failed
+
+
+def reclaim_expired(db, max_attempts=3):
+    """
+    Returns videos whose worker stopped renewing its lease to pending (or
+    failed, after max_attempts), so that another worker's intake picks them
+    up. Returns the number of documents changed.
+    """
+    now = time.time()
+    stale = (db.collection_group("videos").where("status", "==", PROCESSING)
+             .where("lease_expires", "<", now).stream())
+
+    def reclaim(transaction, ref):
+        data = ref.get(transaction=transaction).to_dict() or {}
+        if data.get("status") != PROCESSING or data.get("lease_expires", 0) >= now:
+            return False
+        status = FAILED if data.get("attempts", 0) >= max_attempts else PENDING
+        transaction.update(ref, {"status": status, "worker_id": None, "lease_expires": None})
+        return True
+
+    count = sum(1 for doc in stale if run_transaction(db, reclaim, doc.reference))
+    LEASES.inc(count, event="reclaimed")
+    return count
+
+
+class LeaseHeartbeat:
+    """
+    Renews a claimed video's lease every interval seconds on a background
+    thread while the work runs. lost is set if the lease was taken over, in
+    which case the results should not be committed.
+    """
+
+    def __init__(self, db, ref, worker_id, lease_seconds=120, interval=None):
+        self.db = db
+        self.ref = ref
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.interval = interval or lease_seconds / 3
+        self.stop_event = threading.Event()
+        self.lost = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                if not renew_lease(self.db, self.ref, self.worker_id, self.lease_seconds):
+                    LEASES.inc(event="lost")
+                    self.lost.set()
+                    return
+            except Exception as e:
+                # A transient error is survivable as long as a later renewal
+                # lands before the lease runs out.
+                print(f"Lease renewal failed for {self.ref.path}: {e}")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        return False
+
+
+class Reclaimer:
+    """Runs reclaim_expired at most once every interval seconds from a worker loop."""
+
+    def __init__(self, db, interval=60.0, max_attempts=3):
+        self.db = db
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.last_run = 0.0
+
+    def maybe_run(self):
+        if time.monotonic() - self.last_run < self.interval:
+            return 0
+        self.last_run = time.monotonic()
+        try:
+            count = reclaim_expired(self.db, self.max_attempts)
+        except Exception as e:
+            print(f"Lease reclamation failed: {e}")
+            return 0
+        if count:
+            print(f"Reclaimed {count} video(s) with expired leases.")
+        return count
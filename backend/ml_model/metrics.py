@@ -0,0 +1,218 @@
+"""
+Minimal counters and histograms with Prometheus text exposition.
+
+Metrics are created once at import time by the modules that record them:
+
+    STAGE_SECONDS = metrics.histogram("drowsiness_stage_seconds", "Time spent per stage.", ["stage"])
+
+    with STAGE_SECONDS.time(stage="inference"):
+        ...
+
+Set METRICS_ENABLED=0 before the first import to get no-op metrics: every
+call returns immediately and nothing is registered.
+
+serve_metrics() also answers /ready, which returns 503 until the process
+calls set_ready() (e.g. once its model is loaded and warmed up).
+"""
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds: from sub-millisecond per-frame work up to whole-video downloads.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 120.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+_ready = threading.Event()
+
+
+def _label_key(label_names, labels):
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, key, extra=()):
+    pairs = list(zip(label_names, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Timer:
+    def __init__(self, histogram, key):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum.
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        self._observe(_label_key(self.label_names, labels), value)
+
+    def _observe(self, key, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, **labels):
+        """Context manager that observes the duration of its block in seconds."""
+        return _Timer(self, _label_key(self.label_names, labels))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', le)])} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NoopMetric:
+    """Stands in for Counter and Histogram when metrics are disabled."""
+
+    _timer = _NoopTimer()
+
+    def inc(self, amount=1, **labels):
+        pass
+
+    def observe(self, value, **labels):
+        pass
+
+    def time(self, **labels):
+        return self._timer
+
+
+_NOOP = _NoopMetric()
+
+
+def _register(metric):
+    with _registry_lock:
+        for existing in _registry:
+            if existing.name == metric.name:
+                # Modules recording the same metric share one instance.
+                return existing
+        _registry.append(metric)
+    return metric
+
+
+def counter(name, documentation, label_names=()):
+    return _register(Counter(name, documentation, label_names)) if ENABLED else _NOOP
+
+
+def histogram(name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, documentation, label_names, buckets)) if ENABLED else _NOOP
+
+
+def render():
+    """Returns every registered metric in the Prometheus text format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def set_ready(ready=True):
+    if ready:
+        _ready.set()
+    else:
+        _ready.clear()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self._send(200, render(), CONTENT_TYPE)
+        elif path == "/ready":
+            self._send(200, "ready\n") if is_ready() else self._send(503, "starting\n")
+        else:
+            self.send_error(404)
+
+    def _send(self, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serves /metrics and /ready from a daemon thread, for processes without a web server (the video worker)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+# Artifact each backend loads, relative to the cache entry directory.
+ARTIFACTS = {
+    "savedmodel": "saved_model",
+    "tflite": "model.tflite",
+    "onnx": "model.onnx",
+}
+
+
+def default_cache_dir():
+    return os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "drowsiness-models"))
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(path):
+    """Short content hash of a model file, or of every file in a model directory (SavedModel)."""
+    if os.path.isfile(path):
+        return file_hash(path)[:16]
+    digest = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            digest.update(file_hash(os.path.join(root, name)).encode())
+    return digest.hexdigest()[:16]
+
+
+def cached_model_path(h5_path, backend, cache_dir=None):
+    """
+    Returns the path of the converted artifact for backend, exporting it from
+    the Keras .h5 on the first call. Entries are keyed by the .h5 content
+    hash, so a retrained model gets a fresh conversion and an unchanged one
+    is never converted twice. Keras (and non-.h5 paths) pass through as is.
+    """
+    if backend not in ARTIFACTS or not h5_path.endswith(".h5"):
+        return h5_path
+
+    cache_dir = cache_dir or default_cache_dir()
+    entry = os.path.join(cache_dir, f"{file_hash(h5_path)[:16]}-{backend}")
+    artifact = os.path.join(entry, ARTIFACTS[backend])
+    if os.path.exists(artifact):
+        return artifact
+
+    from export import export_model
+    print(f"Converting {h5_path} for the {backend} backend (cached in {entry})")
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=cache_dir)
+    try:
+        export_model(h5_path, staging, formats=(backend,))
+        # Rename into place so a concurrent or interrupted conversion never
+        # leaves a half-written entry behind; the loser of a race discards its copy.
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            if not os.path.exists(artifact):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return artifact
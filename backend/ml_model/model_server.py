@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from pipeline import StageThread
+from sampler import FrameSampler
+import metrics
+
+BATCH_FRAMES = metrics.histogram("model_server_batch_frames", "Frames per model call made by the model server.",
+                                 buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+QUEUE_SECONDS = metrics.histogram("model_server_queue_seconds",
+                                  "Time a request's frames waited before their batch reached the model.")
+
+
+class _Request:
+    def __init__(self, frames):
+        self.frames = frames
+        self.offset = 0
+        self.remaining = len(frames)
+        self.outputs = None
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+
+
+class ModelServer:
+    """
+    Shares one DrowsinessDetector between concurrent callers.
+
+    predict() may be called from any thread; the frames of every waiting
+    call are gathered into micro-batches of at most max_batch_size frames,
+    closed max_wait seconds after their first frame arrived, and run
+    through the model on a single thread. A call larger than the room left
+    in a batch is split across batches. At most max_pending calls wait at
+    once; predict() blocks beyond that.
+
+    The change gate is not applied: it carries state from frame to frame
+    of one video, which frames from different callers do not share.
+    """
+
+    def __init__(self, detector, max_batch_size=32, max_wait=0.01, max_pending=64):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = StageThread(self._run, "model-server")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def predict(self, frames, timeout=None):
+        """Returns the three score heads for frames, as predict_batch would."""
+        if not self.thread.is_alive():
+            raise RuntimeError("Model server is not running")
+        if len(frames) == 0:
+            return [np.empty((0, len(labels)), dtype=np.float32) for labels in self._labels()]
+        request = _Request(frames)
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            request.error = TimeoutError("Timed out waiting for the model server")
+            raise request.error
+        if request.error is not None:
+            raise request.error
+        return request.outputs
+
+    def _labels(self):
+        return self.detector.alertness_labels, self.detector.yawn_labels, self.detector.eye_labels
+
+    def _run(self):
+        carry = None
+        while True:
+            request = carry or self.queue.get()
+            carry = None
+            if request is None:
+                return
+            parts = []
+            taken = 0
+            deadline = time.perf_counter() + self.max_wait
+            while True:
+                if request.error is None:
+                    n = min(request.remaining, self.max_batch_size - taken)
+                    parts.append((request, request.offset, n))
+                    request.offset += n
+                    request.remaining -= n
+                    taken += n
+                    if request.remaining:
+                        carry = request
+                        break
+                if taken >= self.max_batch_size:
+                    break
+                try:
+                    request = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    # Finish this batch, then stop.
+                    self.queue.put(None)
+                    break
+            if parts:
+                self._run_batch(parts)
+
+    def _run_batch(self, parts):
+        now = time.perf_counter()
+        frames = []
+        for request, offset, n in parts:
+            if offset == 0:
+                QUEUE_SECONDS.observe(now - request.submitted)
+            frames.extend(request.frames[offset:offset + n])
+        BATCH_FRAMES.observe(len(frames))
+        try:
+            heads = self.detector.predict_batch(frames)
+        except Exception as e:
+            for request, offset, n in parts:
+                request.error = e
+                request.done.set()
+            return
+
+        position = 0
+        for request, offset, n in parts:
+            if request.outputs is None:
+                request.outputs = [np.empty((len(request.frames),) + np.shape(head)[1:], dtype=np.float32)
+                                   for head in heads]
+            for output, head in zip(request.outputs, heads):
+                output[offset:offset + n] = head[position:position + n]
+            position += n
+            if offset + n == len(request.frames) and request.error is None:
+                request.done.set()
+
+    def analyze_video(self, video_path, target_fps=15, sample_rate=1, max_frames=None, chunk_size=None,
+                      timeout=None):
+        """
+        Decodes video_path on the calling thread and scores its frames
+        through the shared model, chunk_size frames (default max_batch_size)
+        at a time. Returns a FrameResults.
+        """
+        chunk_size = chunk_size or self.max_batch_size
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video at {video_path}")
+        results = self.detector.new_results()
+        frames, timestamps = [], []
+        try:
+            for frame, timestamp in FrameSampler(cap, target_fps=target_fps, sample_rate=sample_rate):
+                frames.append(frame)
+                timestamps.append(timestamp)
+                if len(frames) == chunk_size:
+                    results.append_batch(*self.predict(frames, timeout), timestamps)
+                    frames, timestamps = [], []
+                if max_frames and len(results) + len(frames) >= max_frames:
+                    break
+            if frames:
+                results.append_batch(*self.predict(frames, timeout), timestamps)
+        finally:
+            cap.release()
+        return results
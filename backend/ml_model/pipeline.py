@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+
+import metrics
+
+# Shared by every module that times a stage of the video worker.
+STAGE_SECONDS = metrics.histogram("drowsiness_stage_seconds", "Time spent in each stage of video analysis.",
+                                  ["stage"])
+VIDEOS = metrics.counter("drowsiness_videos_total", "Videos finished by the worker, by outcome.", ["status"])
+
+# Marks the end of a stage's output.
+_END = object()
+
+
+class StageThread(threading.Thread):
+    def __init__(self, target, name):
+        super().__init__(name=name, daemon=True)
+        self.stage = target
+        self.error = None
+
+    def run(self):
+        try:
+            self.stage()
+        except BaseException as e:
+            self.error = e
+
+
+def put_until_stopped(q, item, stop_event, timeout=0.1):
+    # Blocks while the queue is full (backpressure) but gives up once the
+    # pipeline is shutting down, so a stalled consumer never hangs a producer.
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class FrameDecoder:
+    """
+    Pulls (frame, timestamp) pairs from a sampler on a background thread and
+    hands them to the consumer as (frames, timestamps) batches through a
+    bounded queue.
+    """
+
+    def __init__(self, sampler, batch_size=1, max_frames=None, queue_size=4):
+        self.sampler = sampler
+        self.batch_size = batch_size
+        self.max_frames = max_frames
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.thread = StageThread(self._run, "frame-decoder")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        frames, timestamps = [], []
+        decoded = 0
+        started = time.perf_counter()
+        try:
+            for frame, timestamp in self.sampler:
+                if self.stop_event.is_set():
+                    return
+
+                frames.append(frame)
+                timestamps.append(timestamp)
+                decoded += 1
+                if len(frames) >= self.batch_size:
+                    # Time to grab and decode the batch, not counting waits on a full queue.
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="decode")
+                    if not put_until_stopped(self.queue, (frames, timestamps), self.stop_event):
+                        return
+                    frames, timestamps = [], []
+                    started = time.perf_counter()
+
+                if self.max_frames and decoded >= self.max_frames:
+                    break
+
+            if frames:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="decode")
+                put_until_stopped(self.queue, (frames, timestamps), self.stop_event)
+        finally:
+            put_until_stopped(self.queue, _END, self.stop_event)
+
+    def batches(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _END:
+                return
+            yield batch
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        if self.thread.error:
+            raise self.thread.error
+
+
+class FrameEncoder:
+    """
+    Runs write_fn on every submitted item on a background thread. submit()
+    blocks when the queue is full so decoding and inference cannot outrun
+    the video writer.
+    """
+
+    def __init__(self, write_fn, queue_size=4):
+        self.write_fn = write_fn
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.thread = StageThread(self._run, "frame-encoder")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while True:
+                items = self.queue.get()
+                if items is _END:
+                    return
+                for item in items:
+                    self.write_fn(item)
+        finally:
+            self.stop_event.set()
+
+    def submit(self, items):
+        if not put_until_stopped(self.queue, items, self.stop_event):
+            self.close()
+
+    def close(self):
+        put_until_stopped(self.queue, _END, self.stop_event)
+        self.thread.join()
+        if self.thread.error:
+            raise self.thread.error
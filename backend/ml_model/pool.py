@@ -0,0 +1,186 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+# Per-process state, set up once by _init_worker in every pool process.
+_detector = None
+_bucket = None
+_db = None
+_worker_id = None
+_cache = None
+
+
+def default_threads_per_process(processes):
+    return max(1, (os.cpu_count() or 1) // processes)
+
+
+def _init_worker(detector_options, num_threads, use_firebase, ready, warm_up_batch_sizes, cache_options,
+                 metrics_port=None, next_index=None):
+    global _detector, _bucket, _db, _worker_id, _cache
+    # Metrics recorded here live in this process's registry, so each process
+    # serves its own on metrics_port + its index (1, 2, ...).
+    import metrics
+    if metrics_port is not None:
+        with next_index.get_lock():
+            next_index.value += 1
+            index = next_index.value
+        metrics.serve_metrics(metrics_port + index)
+    # Cap every thread pool in this process before TensorFlow or OpenCV
+    # start theirs, so N processes do not oversubscribe the cores.
+    for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+        os.environ[var] = str(num_threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+
+    import cv2
+    from implementation import DrowsinessDetector, init
+    cv2.setNumThreads(num_threads)
+    _detector = DrowsinessDetector(num_threads=num_threads, **detector_options).warm_up(warm_up_batch_sizes)
+
+    if use_firebase:
+        from firebase_admin import firestore, storage
+        from leases import default_worker_id
+        init()
+        _worker_id = default_worker_id()
+        _db = firestore.client()
+        _bucket = storage.bucket()
+        if cache_options is not None:
+            from result_cache import FirestoreResultCache
+            _cache = FirestoreResultCache(_db, **cache_options)
+    metrics.set_ready()
+    ready.release()
+
+
+def _analyze_document(doc_path, batch_size, target_fps):
+    from implementation import analyze_claimed_video
+    doc = _db.document(doc_path).get()
+    if doc.exists:
+        analyze_claimed_video(_detector, doc, _bucket, _db, _worker_id, batch_size, target_fps, cache=_cache)
+    return doc_path
+
+
+def _analyze_local(video_path, batch_size, target_fps):
+    summary = _detector.new_summary()
+    frames = 0
+    for batch in _detector.process_video_iter(video_path, target_fps=target_fps, batch_size=batch_size,
+                                              per_batch=True):
+        summary.update(batch)
+        frames += len(batch)
+    return {"video": video_path, "frames": frames, "summary": summary.summary()}
+
+
+class WorkerPool:
+    """
+    N worker processes, each holding its own DrowsinessDetector loaded once
+    by the pool initializer. Jobs go through the pool's shared task queue and
+    are run by whichever process is free. With metrics_port set, process i
+    serves its /metrics and /ready on metrics_port + i.
+    """
+
+    def __init__(self, processes, model_path, backend="keras", num_threads=None, use_firebase=True,
+                 batch_size=16, target_fps=15, gate=None, cache_options=None, metrics_port=None):
+        self.processes = processes
+        self.num_threads = num_threads or default_threads_per_process(processes)
+        self.batch_size = batch_size
+        self.target_fps = target_fps
+        # Convert once here rather than racing to do it in every process.
+        from model_cache import cached_model_path
+        model_path = cached_model_path(model_path, backend)
+        # spawn: a forked child would inherit the parent's TensorFlow and
+        # gRPC state, which is not fork-safe.
+        context = multiprocessing.get_context("spawn")
+        self.ready = context.Semaphore(0)
+        self.next_index = context.Value("i", 0)
+        self.pool = context.Pool(processes, initializer=_init_worker,
+                                 initargs=({"model_path": model_path, "backend": backend, "gate": gate},
+                                           self.num_threads, use_firebase, self.ready,
+                                           sorted({1, batch_size}), cache_options, metrics_port,
+                                           self.next_index))
+
+    def wait_ready(self):
+        """Blocks until every process has loaded and warmed up its model."""
+        for _ in range(self.processes):
+            self.ready.acquire()
+
+    def submit_document(self, doc_path, callback=None, error_callback=None):
+        return self.pool.apply_async(_analyze_document, (doc_path, self.batch_size, self.target_fps),
+                                     callback=callback, error_callback=error_callback)
+
+    def map_local(self, video_paths):
+        return self.pool.starmap(_analyze_local, [(path, self.batch_size, self.target_fps) for path in video_paths])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+def run_pool(pool, intake, max_in_flight=None, idle_timeout=1.0, reclaimer=None, cache=None):
+    """
+    Feeds documents from an intake into the pool, keeping at most
+    max_in_flight jobs queued or running so pending videos stay in Firestore
+    (visible to other workers) rather than piling up in this process.
+    """
+    slots = threading.BoundedSemaphore(max_in_flight or pool.processes * 2)
+
+    def release(_):
+        slots.release()
+
+    def failed(error):
+        print(f"Video job failed: {error}")
+        slots.release()
+
+    while not intake.closed:
+        if reclaimer is not None:
+            reclaimer.maybe_run()
+        if cache is not None:
+            cache.maybe_evict()
+        slots.acquire()
+        doc = intake.get(timeout=idle_timeout)
+        if doc is None:
+            slots.release()
+            continue
+        pool.submit_document(doc.reference.path, callback=release, error_callback=failed)
+
+
+def measure_scaling(video_paths, model_path, process_counts, backend="keras", batch_size=16, target_fps=15):
+    """
+    Runs the same set of local videos through pools of each size and reports
+    videos/s and frames/s, excluding model load time.
+    """
+    report = []
+    for processes in process_counts:
+        pool = WorkerPool(processes, model_path, backend, use_firebase=False, batch_size=batch_size,
+                          target_fps=target_fps)
+        try:
+            pool.map_local(video_paths[:processes])  # warm every process
+            start = time.perf_counter()
+            results = pool.map_local(video_paths)
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.close()
+        frames = sum(r["frames"] for r in results)
+        report.append({
+            "processes": processes,
+            "threads_per_process": pool.num_threads,
+            "videos": len(video_paths),
+            "seconds": round(elapsed, 3),
+            "videos_per_second": round(len(video_paths) / elapsed, 3),
+            "frames_per_second": round(frames / elapsed, 1),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure worker pool throughput on local videos.")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--model", default="multi_task_drowsiness_model.h5")
+    parser.add_argument("--backend", default="keras")
+    parser.add_argument("--processes", default="1,2,4")
+    parser.add_argument("--repeat", type=int, default=4, help="times each video is queued")
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.processes.split(",")]
+    report = measure_scaling(args.videos * args.repeat, args.model, counts, backend=args.backend)
+    print(json.dumps(report, indent=2))
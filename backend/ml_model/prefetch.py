@@ -0,0 +1,176 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+from leases import LeaseHeartbeat, claim_video, fail_video, release_video
+from pipeline import STAGE_SECONDS, StageThread, put_until_stopped
+
+
+def download_video(blob, directory=None):
+    """Downloads a video blob into a new temp file and returns its path."""
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(blob.name)[1] or ".mp4", dir=directory)
+    os.close(fd)
+    try:
+        blob.download_to_filename(path)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+class DiskBudget:
+    """
+    Tracks bytes of downloaded video on disk. reserve() blocks until the
+    reservation fits under max_bytes; a single video larger than the whole
+    budget is still admitted once nothing else is on disk.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.cond = threading.Condition()
+
+    def reserve(self, size, stop_event=None, timeout=0.1):
+        with self.cond:
+            while self.used and self.used + size > self.max_bytes:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                self.cond.wait(timeout)
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self.cond:
+            self.used -= size
+            self.cond.notify_all()
+
+
+class PrefetchedVideo:
+    """A claimed video document whose file is already on local disk."""
+
+    def __init__(self, doc, path, size, lease, budget, summary=None):
+        self.doc = doc
+        self.path = path
+        self.size = size
+        self.lease = lease
+        self.budget = budget
+        # Set instead of path when the result cache already had the summary.
+        self.summary = summary
+
+    def done(self, failed=False, aborted=False, permanent=False):
+        # Stops the lease heartbeat, hands the video back to the queue if the
+        # analysis failed (or marks it failed outright if permanent), and
+        # frees the file and its share of the budget. aborted returns a video
+        # that was never analysed, e.g. on shutdown, without using up an attempt.
+        self.lease.__exit__(None, None, None)
+        try:
+            if permanent:
+                fail_video(self.lease.db, self.doc.reference, self.lease.worker_id)
+            elif failed or aborted:
+                release_video(self.lease.db, self.doc.reference, self.lease.worker_id, count_attempt=not aborted)
+        finally:
+            if self.path is not None:
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+            self.budget.release(self.size)
+
+
+class Prefetcher:
+    """
+    Claims and downloads up to depth videos ahead of the one being analysed,
+    on a background thread, so storage downloads overlap with inference.
+    Downloaded files share a max_bytes disk budget and live in a private temp
+    directory that is removed on close().
+
+    cache_lookup(data), if given, is tried first with the document's data;
+    a summary it returns is passed along and the download is skipped.
+    """
+
+    def __init__(self, intake, bucket, db, worker_id, depth=2, max_bytes=2 * 1024 ** 3, lease_seconds=120,
+                 idle_timeout=1.0, cache_lookup=None):
+        self.intake = intake
+        self.bucket = bucket
+        self.db = db
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.idle_timeout = idle_timeout
+        self.cache_lookup = cache_lookup
+        self.budget = DiskBudget(max_bytes)
+        self.directory = tempfile.mkdtemp(prefix="drowsiness-prefetch-")
+        self.queue = queue.Queue(maxsize=depth)
+        self.stop_event = threading.Event()
+        self.thread = StageThread(self._run, "video-prefetcher")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    @property
+    def closed(self):
+        return self.stop_event.is_set() or self.intake.closed
+
+    def _run(self):
+        while not self.closed:
+            doc = self.intake.get(timeout=self.idle_timeout)
+            if doc is None or not claim_video(self.db, doc.reference, self.worker_id, self.lease_seconds):
+                continue
+
+            lease = LeaseHeartbeat(self.db, doc.reference, self.worker_id, self.lease_seconds).__enter__()
+            item = None
+            try:
+                item = self._fetch(doc, lease)
+            except Exception as e:
+                print(f"Download failed for {doc.reference.path}: {e}")
+            if item is None:
+                # A fetch cut short by close() (e.g. waiting on the disk
+                # budget) does not use up one of the video's attempts.
+                lease.__exit__(None, None, None)
+                release_video(self.db, doc.reference, self.worker_id, count_attempt=not self.stop_event.is_set())
+            elif not put_until_stopped(self.queue, item, self.stop_event):
+                item.done(aborted=True)
+
+    def _fetch(self, doc, lease):
+        data = doc.to_dict()
+        summary = self.cache_lookup(data) if self.cache_lookup else None
+        if summary is not None:
+            return PrefetchedVideo(doc, None, 0, lease, self.budget, summary)
+
+        # get_blob() checks existence and fetches the size in one round trip.
+        file_path = data["file_path"]
+        blob = self.bucket.get_blob(file_path)
+        if blob is None:
+            print(f"Video not found in storage: {file_path}")
+            return None
+        size = blob.size or 0
+        if not self.budget.reserve(size, self.stop_event):
+            return None
+        try:
+            with STAGE_SECONDS.time(stage="download"):
+                path = download_video(blob, self.directory)
+        except BaseException:
+            self.budget.release(size)
+            raise
+        return PrefetchedVideo(doc, path, size, lease, self.budget)
+
+    def get(self, timeout=None):
+        """Returns the next PrefetchedVideo, or None if none was ready within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            if self.thread.error:
+                raise self.thread.error
+            return None
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        while True:
+            try:
+                self.queue.get_nowait().done(aborted=True)
+            except queue.Empty:
+                break
+        shutil.rmtree(self.directory, ignore_errors=True)
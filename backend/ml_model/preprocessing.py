@@ -0,0 +1,33 @@
+import tensorflow as tf
+
+from backends import INPUT_SIZE
+
+
+class FramePreprocessing(tf.keras.layers.Layer):
+    """
+    Turns raw uint8 BGR frames of any size into the model input: bilinear
+    resize to INPUT_SIZE, BGR -> RGB, and scaling to [-1, 1] exactly as
+    mobilenet_v2.preprocess_input does during training.
+    """
+
+    def __init__(self, size=INPUT_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.size = tuple(size)
+
+    def call(self, frames):
+        x = tf.cast(frames, tf.float32)
+        x = tf.image.resize(x, self.size, method="bilinear")
+        x = tf.reverse(x, axis=[-1])
+        return x / 127.5 - 1.0
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"size": self.size})
+        return config
+
+
+def with_preprocessing(model, size=INPUT_SIZE):
+    """Wraps a trained model so it accepts (N, H, W, 3) uint8 BGR frames."""
+    frames = tf.keras.Input(shape=(None, None, 3), dtype="uint8", name="frames")
+    outputs = model(FramePreprocessing(size, name="frame_preprocessing")(frames))
+    return tf.keras.Model(frames, outputs, name=f"{model.name}_with_preprocessing")
@@ -0,0 +1,125 @@
+import copy
+import hashlib
+import json
+import time
+
+import metrics
+from ttl_cache import TTLCache
+
+LOOKUPS = metrics.counter("drowsiness_result_cache_total", "Result cache lookups, by outcome.", ["result"])
+
+
+def result_cache_key(content_hash, model_version, target_fps=None, sample_rate=1, gate=None):
+    """
+    Identifies a summary by the video content and everything that changes
+    the analysis: the model weights and how frames are sampled and gated.
+    Batch size and backend are left out since they do not change results.
+    """
+    config = {
+        "target_fps": target_fps,
+        "sample_rate": sample_rate,
+        "gate": [gate.threshold, gate.max_reuse, list(gate.size)] if gate else None,
+    }
+    raw = json.dumps([content_hash, model_version, config], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _ResultCache:
+    evict_interval = 3600.0
+    last_evict = 0.0
+
+    def maybe_evict(self):
+        # For worker loops: runs evict() at most once every evict_interval seconds.
+        if time.monotonic() - self.last_evict < self.evict_interval:
+            return 0
+        self.last_evict = time.monotonic()
+        try:
+            return self.evict()
+        except Exception as e:
+            print(f"Result cache eviction failed: {e}")
+            return 0
+
+
+class MemoryResultCache(_ResultCache):
+    """
+    In-process result cache; the local stand-in for FirestoreResultCache.
+
+    Keeps at most max_entries summaries, evicting the least recently used,
+    and treats entries older than max_age seconds as missing.
+    """
+
+    def __init__(self, max_entries=10000, max_age=30 * 24 * 3600, clock=time.time):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = TTLCache(max_entries, max_age, clock)
+
+    def get(self, key):
+        summary = self.entries.get(key)
+        if summary is None:
+            LOOKUPS.inc(result="miss")
+            return None
+        LOOKUPS.inc(result="hit")
+        return copy.deepcopy(summary)
+
+    def put(self, key, summary):
+        self.entries.put(key, copy.deepcopy(summary))
+
+    def evict(self):
+        """Drops expired entries; returns how many were removed."""
+        return self.entries.evict_expired()
+
+
+class FirestoreResultCache(_ResultCache):
+    """
+    Result cache shared by every worker, one document per key in a
+    top-level collection. Reads check the age and bump last_used; evict()
+    deletes expired entries and the least recently used ones beyond
+    max_entries, and is meant to run periodically rather than per video.
+    """
+
+    def __init__(self, db, collection="result_cache", max_entries=10000, max_age=30 * 24 * 3600, clock=time.time):
+        self.db = db
+        self.collection = db.collection(collection)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.clock = clock
+
+    def get(self, key):
+        ref = self.collection.document(key)
+        snapshot = ref.get()
+        data = snapshot.to_dict() if snapshot.exists else None
+        if data is not None and self.clock() - data["created"] > self.max_age:
+            ref.delete()
+            data = None
+        if data is None:
+            LOOKUPS.inc(result="miss")
+            return None
+        ref.update({"last_used": self.clock()})
+        LOOKUPS.inc(result="hit")
+        return data["results"]
+
+    def put(self, key, summary):
+        now = self.clock()
+        self.collection.document(key).set({"results": summary, "created": now, "last_used": now})
+
+    def evict(self):
+        cutoff = self.clock() - self.max_age
+        removed = 0
+        for snapshot in self.collection.where("created", "<", cutoff).stream():
+            snapshot.reference.delete()
+            removed += 1
+        # Count first (one aggregation read) and only fetch the excess, so a
+        # cache under its limit costs nothing to check.
+        excess = int(self.collection.count().get()[0][0].value) - self.max_entries
+        if excess > 0:
+            for snapshot in self.collection.order_by("last_used").limit(excess).stream():
+                snapshot.reference.delete()
+                removed += 1
+        return removed
+
+
+def video_cache_key(detector, data, target_fps=None):
+    """Cache key for a video document's data, or None if the upload recorded no content hash."""
+    if not data.get("content_hash"):
+        return None
+    return result_cache_key(data["content_hash"], detector.model_version, target_fps, gate=detector.gate)
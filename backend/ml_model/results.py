@@ -0,0 +1,190 @@
+import numpy as np
+
+ALERTNESS_LABELS = ["Alert", "Low Vigilant", "Very Drowsy"]
+YAWN_LABELS = ["Normal", "Talking", "Yawning"]
+EYE_LABELS = ["Eyes Open", "Eyes Closed"]
+
+
+class FrameResults:
+    """
+    Columnar per-frame detector output.
+
+    Scores are stored as one float32 matrix per head, argmax indices as int8,
+    timestamps as float64 and a bool flag for frames whose prediction was
+    reused by the change gate, in arrays that grow geometrically. Indexing
+    and iteration still yield the per-frame dicts produced by
+    DrowsinessDetector.build_result, so list-based callers keep working.
+    """
+
+    _COLUMNS = ("timestamps", "alertness_scores", "yawn_scores", "eye_scores",
+                "alertness_idx", "yawn_idx", "eye_idx", "reused")
+
+    def __init__(self, capacity=256, alertness_labels=ALERTNESS_LABELS, yawn_labels=YAWN_LABELS,
+                 eye_labels=EYE_LABELS):
+        self.alertness_labels = list(alertness_labels)
+        self.yawn_labels = list(yawn_labels)
+        self.eye_labels = list(eye_labels)
+        self.size = 0
+
+        capacity = max(int(capacity), 1)
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.alertness_scores = np.empty((capacity, len(self.alertness_labels)), dtype=np.float32)
+        self.yawn_scores = np.empty((capacity, len(self.yawn_labels)), dtype=np.float32)
+        self.eye_scores = np.empty((capacity, len(self.eye_labels)), dtype=np.float32)
+        self.alertness_idx = np.empty(capacity, dtype=np.int8)
+        self.yawn_idx = np.empty(capacity, dtype=np.int8)
+        self.eye_idx = np.empty(capacity, dtype=np.int8)
+        self.reused = np.empty(capacity, dtype=bool)
+
+    @property
+    def capacity(self):
+        return len(self.timestamps)
+
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append_batch(self, alertness_scores, yawn_scores, eye_scores, timestamps, reused=False):
+        n = len(timestamps)
+        self._reserve(self.size + n)
+        end = self.size + n
+        self.timestamps[self.size:end] = timestamps
+        self.alertness_scores[self.size:end] = alertness_scores
+        self.yawn_scores[self.size:end] = yawn_scores
+        self.eye_scores[self.size:end] = eye_scores
+        self.alertness_idx[self.size:end] = np.argmax(alertness_scores, axis=1)
+        self.yawn_idx[self.size:end] = np.argmax(yawn_scores, axis=1)
+        self.eye_idx[self.size:end] = np.argmax(eye_scores, axis=1)
+        self.reused[self.size:end] = reused
+        self.size = end
+
+    def append(self, result):
+        self.append_batch([result["alertness"]["raw_scores"]], [result["yawn"]["raw_scores"]],
+                          [result["eyes"]["raw_scores"]], [result["timestamp"]], result.get("reused", False))
+
+    @classmethod
+    def from_dicts(cls, results, **labels):
+        frame_results = cls(capacity=len(results), **labels)
+        if results:
+            frame_results.append_batch([r["alertness"]["raw_scores"] for r in results],
+                                       [r["yawn"]["raw_scores"] for r in results],
+                                       [r["eyes"]["raw_scores"] for r in results],
+                                       [r["timestamp"] for r in results],
+                                       [r.get("reused", False) for r in results])
+        return frame_results
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.size))]
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("frame index out of range")
+
+        alertness_idx = int(self.alertness_idx[i])
+        yawn_idx = int(self.yawn_idx[i])
+        eye_idx = int(self.eye_idx[i])
+        return {
+            "timestamp": float(self.timestamps[i]),
+            "reused": bool(self.reused[i]),
+            "alertness": {
+                "label": self.alertness_labels[alertness_idx],
+                "index": alertness_idx,
+                "confidence": float(self.alertness_scores[i, alertness_idx]),
+                "raw_scores": self.alertness_scores[i].tolist()
+            },
+            "eyes": {
+                "label": self.eye_labels[eye_idx],
+                "closed": eye_idx == 1,
+                "confidence": float(self.eye_scores[i, eye_idx]),
+                "raw_scores": self.eye_scores[i].tolist()
+            },
+            "yawn": {
+                "label": self.yawn_labels[yawn_idx],
+                "yawning": self.yawn_labels[yawn_idx] == "Yawning",
+                "confidence": float(self.yawn_scores[i, yawn_idx]),
+                "raw_scores": self.yawn_scores[i].tolist()
+            }
+        }
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def to_dicts(self):
+        return list(self)
+
+    def extend(self, other):
+        n = len(other)
+        self._reserve(self.size + n)
+        for name in self._COLUMNS:
+            getattr(self, name)[self.size:self.size + n] = getattr(other, name)[:n]
+        self.size += n
+
+    def labels(self):
+        return {"alertness_labels": self.alertness_labels, "yawn_labels": self.yawn_labels,
+                "eye_labels": self.eye_labels}
+
+    def summary(self):
+        return OnlineSummary(**self.labels()).update(self).summary()
+
+
+class OnlineSummary:
+    """
+    Running per-class counts that produce the same summary as
+    FrameResults.summary() without keeping any per-frame data, so memory
+    stays constant however long the recording is. summary() can be called
+    at any point for a partial result.
+    """
+
+    def __init__(self, alertness_labels=ALERTNESS_LABELS, yawn_labels=YAWN_LABELS, eye_labels=EYE_LABELS):
+        self.alertness_labels = list(alertness_labels)
+        self.yawn_labels = list(yawn_labels)
+        self.eye_labels = list(eye_labels)
+        self.total = 0
+        self.reused = 0
+        self.alertness_counts = np.zeros(len(self.alertness_labels), dtype=np.int64)
+        self.yawn_counts = np.zeros(len(self.yawn_labels), dtype=np.int64)
+        self.eye_counts = np.zeros(len(self.eye_labels), dtype=np.int64)
+
+    def update(self, results):
+        """Adds a FrameResults chunk or a single per-frame result dict."""
+        if isinstance(results, FrameResults):
+            n = len(results)
+            self.alertness_counts += np.bincount(results.alertness_idx[:n], minlength=len(self.alertness_labels))
+            self.yawn_counts += np.bincount(results.yawn_idx[:n], minlength=len(self.yawn_labels))
+            self.eye_counts += np.bincount(results.eye_idx[:n], minlength=len(self.eye_labels))
+            self.reused += int(np.count_nonzero(results.reused[:n]))
+            self.total += n
+        else:
+            self.alertness_counts[self.alertness_labels.index(results["alertness"]["label"])] += 1
+            self.yawn_counts[self.yawn_labels.index(results["yawn"]["label"])] += 1
+            self.eye_counts[self.eye_labels.index(results["eyes"]["label"])] += 1
+            self.reused += int(results.get("reused", False))
+            self.total += 1
+        return self
+
+    def summary(self):
+        total = self.total
+        if not total:
+            return {"error": "No results to analyze."}
+
+        alertness_percentages = np.round(self.alertness_counts / total * 100, 2)
+        return {
+            "total_frames": total,
+            "eyes_closed_frames": int(self.eye_counts[1]),
+            "yawning_frames": int(self.yawn_counts[self.yawn_labels.index("Yawning")]),
+            "alertness_counts": {label: int(c) for label, c in zip(self.alertness_labels, self.alertness_counts)},
+            "alertness_percentages": {label: float(p) for label, p in zip(self.alertness_labels, alertness_percentages)},
+            "yawning_state": self.yawn_labels[int(np.argmax(self.yawn_counts))],
+            "reused_frames": self.reused
+        }
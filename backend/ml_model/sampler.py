@@ -0,0 +1,63 @@
+import cv2
+
+
+class FrameSampler:
+    """
+    Iterates over (frame, timestamp) pairs from an open cv2.VideoCapture,
+    decoding only the frames that are kept.
+
+    Frames are kept either at a target analysis rate (target_fps) or every
+    sample_rate-th frame. Skipped frames are only grab()bed, which demuxes
+    the packet without the retrieve() colour conversion and copy. Timestamps
+    are presentation times in seconds from CAP_PROP_POS_MSEC, falling back to
+    frame_index / fps for containers that do not report a position.
+    """
+
+    def __init__(self, cap, target_fps=None, sample_rate=1):
+        if target_fps is not None and target_fps <= 0:
+            raise ValueError("target_fps must be positive")
+        if sample_rate < 1:
+            raise ValueError("sample_rate must be at least 1")
+
+        self.cap = cap
+        self.target_fps = target_fps
+        self.sample_rate = sample_rate
+        self.source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.grabbed = 0
+        self.decoded = 0
+
+    def _timestamp(self, frame_index):
+        position_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if position_ms > 0 or frame_index == 0 or not self.source_fps:
+            return position_ms / 1000.0
+        return frame_index / self.source_fps
+
+    def __iter__(self):
+        interval = 1.0 / self.target_fps if self.target_fps else None
+        next_due = 0.0
+        frame_index = -1
+
+        while self.cap.grab():
+            frame_index += 1
+            self.grabbed += 1
+
+            if interval is None:
+                if (frame_index + 1) % self.sample_rate != 0:
+                    continue
+                timestamp = self._timestamp(frame_index)
+            else:
+                timestamp = self._timestamp(frame_index)
+                if timestamp + 1e-6 < next_due:
+                    continue
+                # Advance from the schedule rather than from this frame so the
+                # average rate matches target_fps even with jittery timestamps,
+                # but never schedule into the past after a gap in the stream.
+                next_due += interval
+                if next_due <= timestamp:
+                    next_due = timestamp + interval
+
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            self.decoded += 1
+            yield frame, timestamp
@@ -0,0 +1,135 @@
+import json
+
+import cv2
+import numpy as np
+
+from results import FrameResults
+
+RED = (0, 0, 255)
+GREEN = (0, 255, 0)
+WHITE = (255, 255, 255)
+
+
+class FrameAnnotator:
+    """
+    Draws the results banner onto frames in place.
+
+    Only the banner rows are darkened (the same 0.4 blend with black the old
+    full-frame overlay produced), and the per-label text prefixes and colours
+    are built once and reused for every frame.
+    """
+
+    def __init__(self, banner_height=150, font=cv2.FONT_HERSHEY_SIMPLEX, font_scale=0.7, thickness=2):
+        self.banner_height = banner_height
+        self.font = font
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.lines = {}
+
+    def _line(self, head, label, flagged):
+        key = (head, label, flagged)
+        if key not in self.lines:
+            prefix = {"alertness": "Alertness", "eyes": "Eyes", "yawn": "Yawn"}[head]
+            color = WHITE if head == "alertness" else (RED if flagged else GREEN)
+            self.lines[key] = (f"{prefix}: {label} (", color)
+        return self.lines[key]
+
+    def annotate(self, frame, result):
+        banner = frame[:self.banner_height]
+        cv2.convertScaleAbs(banner, dst=banner, alpha=0.4)
+
+        rows = (("alertness", False, 30), ("eyes", result["eyes"]["closed"], 70),
+                ("yawn", result["yawn"]["yawning"], 110))
+        for head, flagged, y in rows:
+            text, color = self._line(head, result[head]["label"], flagged)
+            cv2.putText(frame, f"{text}{result[head]['confidence']:.2f})", (20, y), self.font, self.font_scale,
+                        color, self.thickness)
+        return frame
+
+    def annotate_batch(self, frames, results):
+        for i, frame in enumerate(frames):
+            self.annotate(frame, results[i])
+        return frames
+
+
+class Sink:
+    """
+    Receives every processed batch from DrowsinessDetector.
+
+    annotated: the sink wants frames with the results banner drawn on them.
+    background: write() runs on the encoder thread instead of the inference
+    thread. Set stopped to ask the detector to stop early.
+    """
+
+    annotated = False
+    background = False
+    stopped = False
+
+    def open(self, fps, size):
+        pass
+
+    def write(self, frames, results):
+        pass
+
+    def close(self):
+        pass
+
+
+class VideoWriterSink(Sink):
+    annotated = True
+    background = True
+
+    def __init__(self, output_path, fourcc="XVID"):
+        self.output_path = output_path
+        self.fourcc = fourcc
+        self.writer = None
+
+    def open(self, fps, size):
+        self.writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*self.fourcc), fps, size)
+
+    def write(self, frames, results):
+        for frame in frames:
+            self.writer.write(frame)
+
+    def close(self):
+        if self.writer:
+            self.writer.release()
+
+
+class DisplaySink(Sink):
+    annotated = True
+
+    def __init__(self, window_name="Drowsiness Detection"):
+        self.window_name = window_name
+
+    def write(self, frames, results):
+        for frame in frames:
+            cv2.imshow(self.window_name, frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                self.stopped = True
+                return
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class ResultsFileSink(Sink):
+    """Collects results and writes them on close as JSON (list of per-frame dicts) or NPZ (columns)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = None
+
+    def write(self, frames, results):
+        if self.results is None:
+            self.results = FrameResults(len(results), **results.labels())
+        self.results.extend(results)
+
+    def close(self):
+        results = self.results if self.results is not None else FrameResults(1)
+        if self.path.endswith(".npz"):
+            n = len(results)
+            np.savez_compressed(self.path, **{name: getattr(results, name)[:n] for name in FrameResults._COLUMNS})
+        else:
+            with open(self.path, "w") as f:
+                json.dump(results.to_dicts(), f)
@@ -0,0 +1,106 @@
+import threading
+
+from fakes import FakeFirestore
+from leases import FAILED, PENDING, PROCESSING, claim_video, fail_video, reclaim_expired, release_video, renew_lease
+
+
+def pending_video(db, path="users/u/videos/v"):
+    ref = db.document(path)
+    ref.set({"status": PENDING, "file_path": "videos/u/v.mov"})
+    return ref
+
+
+def test_only_one_of_two_racing_workers_claims():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    start = threading.Barrier(2)
+    results = {}
+
+    def worker(worker_id):
+        start.wait()
+        results[worker_id] = claim_video(db, ref, worker_id)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results.values()) == [False, True]
+    data = ref.get().to_dict()
+    winner = next(w for w, claimed in results.items() if claimed)
+    assert data["status"] == PROCESSING
+    assert data["worker_id"] == winner
+    assert data["attempts"] == 1
+
+
+def test_live_lease_is_not_taken_over():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    assert claim_video(db, ref, "a", lease_seconds=120)
+    assert not claim_video(db, ref, "b")
+    assert renew_lease(db, ref, "a")
+    assert not renew_lease(db, ref, "b")
+
+
+def test_expired_lease_is_taken_over():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    assert claim_video(db, ref, "a", lease_seconds=-1)
+    assert claim_video(db, ref, "b")
+
+    data = ref.get().to_dict()
+    assert data["worker_id"] == "b"
+    assert data["attempts"] == 2
+    # The old worker can no longer renew or hand back the video.
+    assert not renew_lease(db, ref, "a")
+    assert not release_video(db, ref, "a")
+
+
+def test_reclaim_returns_expired_video_to_pending():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    claim_video(db, ref, "a", lease_seconds=-1)
+    assert reclaim_expired(db) == 1
+    data = ref.get().to_dict()
+    assert data["status"] == PENDING
+    assert data["worker_id"] is None
+
+
+def test_video_fails_after_max_attempts():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    for attempt in range(3):
+        assert claim_video(db, ref, "a", max_attempts=3)
+        assert release_video(db, ref, "a")
+    assert not claim_video(db, ref, "a", max_attempts=3)
+    assert ref.get().to_dict()["status"] == FAILED
+
+
+def test_expired_lease_fails_after_max_attempts():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    for attempt in range(3):
+        assert claim_video(db, ref, f"w{attempt}", lease_seconds=-1, max_attempts=3)
+    assert reclaim_expired(db, max_attempts=3) == 1
+    assert ref.get().to_dict()["status"] == FAILED
+
+
+def test_release_without_counting_keeps_attempts():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    for attempt in range(5):
+        assert claim_video(db, ref, "a", max_attempts=3)
+        assert release_video(db, ref, "a", count_attempt=False)
+    data = ref.get().to_dict()
+    assert data["status"] == PENDING
+    assert data["attempts"] == 0
+
+
+def test_fail_video_is_final():
+    db = FakeFirestore()
+    ref = pending_video(db)
+    claim_video(db, ref, "a")
+    assert fail_video(db, ref, "a")
+    assert ref.get().to_dict()["status"] == FAILED
+    assert not claim_video(db, ref, "b")
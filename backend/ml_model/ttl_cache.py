@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe LRU of at most max_entries values, each expiring ttl seconds
+    after it was put (or earlier, at an expires time given to put()).
+
+    Values are kept and returned as given, so callers copy mutable ones.
+    Shared by the worker's result cache and the Flask app's caches.
+    """
+
+    def __init__(self, max_entries, ttl, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """The live value for key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.clock() >= entry[0]:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, expires=None):
+        """Stores value until expires (capped at ttl from now); returns False if it would already be expired."""
+        now = self.clock()
+        expires = now + self.ttl if expires is None else min(expires, now + self.ttl)
+        with self.lock:
+            if expires <= now:
+                self.entries.pop(key, None)
+                return False
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return True
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def remove_if(self, predicate):
+        """Drops every entry whose predicate(key, value) is true; returns how many were removed."""
+        with self.lock:
+            keys = [key for key, (_, value) in self.entries.items() if predicate(key, value)]
+            for key in keys:
+                del self.entries[key]
+            return len(keys)
+
+    def evict_expired(self):
+        """Drops expired entries; returns how many were removed."""
+        with self.lock:
+            now = self.clock()
+            keys = [key for key, (expires, _) in self.entries.items() if now >= expires]
+            for key in keys:
+                del self.entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)